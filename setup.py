@@ -1,5 +1,5 @@
 from setuptools import setup, find_namespace_packages
-from setup_helper import find_resource_files
+from setup_helper import find_resource_files, precompress_cmdclass
 
 # -- Apps Definition -- #
 app_package = 'historical_validation_tool_colombia'
@@ -29,4 +29,6 @@ setup(
     include_package_data=True,
     zip_safe=False,
     install_requires=dependencies,
+    # Precompressed (.gz/.br) static JSON, written by the build and the installs
+    cmdclass=precompress_cmdclass('tethysapp/' + app_package + '/public', 'tethysapp/' + app_package),
 )
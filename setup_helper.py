@@ -10,3 +10,104 @@ def find_resource_files(directory, relative_to=None):
                 paths.append(os.path.join('..', path, filename))
     return paths
 
+
+def precompress_files(directory, extensions=('.json', '.geojson'), min_size=1024):
+    """
+    Write the .gz (and .br, when brotli is installed) siblings of the static
+    files of directory, so they can be served precompressed. Siblings newer
+    than their source are kept (the source is not even read).
+    Returns the paths of the siblings.
+    """
+    import gzip
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('.br', lambda data: brotli.compress(data, quality=11)))
+
+    siblings = []
+    for (path, directories, filenames) in os.walk(directory):
+        for filename in filenames:
+            src_file = os.path.join(path, filename)
+            if not filename.endswith(extensions) or os.path.getsize(src_file) < min_size:
+                continue
+
+            content = None
+            for ext, compress in compressors:
+                out_file = src_file + ext
+                siblings.append(out_file)
+                if os.path.isfile(out_file) and os.path.getmtime(out_file) >= os.path.getmtime(src_file):
+                    continue
+                if content is None:
+                    with open(src_file, 'rb') as f:
+                        content = f.read()
+                with open(out_file, 'wb') as f:
+                    f.write(compress(content))
+    return siblings
+
+
+def precompress_cmdclass(directory, relative_to):
+    """
+    setup() cmdclass that writes the precompressed siblings of directory
+    (precompress_files) when the app is built or installed, not on every
+    setup.py call:
+        build_py                 : before the build, the siblings are
+                                   added to the package data (relative to
+                                   relative_to, as find_resource_files)
+        develop, editable_wheel  : before the development install
+                                   (tethys install -d, pip install -e)
+        precompress              : standalone (python setup.py precompress),
+                                   after the static files change
+    """
+    from setuptools import Command
+    from setuptools.command.build_py import build_py
+    from setuptools.command.develop import develop
+
+    class Precompress(Command):
+        description = 'write the .gz/.br siblings of the static JSON files'
+        user_options = []
+
+        def initialize_options(self):
+            pass
+
+        def finalize_options(self):
+            pass
+
+        def run(self):
+            precompress_files(directory)
+
+    class Precompress_build_py(build_py):
+        def run(self):
+            siblings = precompress_files(directory)
+            package_data = self.package_data.setdefault('', [])
+            for sibling in siblings:
+                sibling = os.path.relpath(sibling, relative_to)
+                if sibling not in package_data:
+                    package_data.append(sibling)
+            build_py.run(self)
+
+    class Precompress_develop(develop):
+        def run(self):
+            precompress_files(directory)
+            develop.run(self)
+
+    cmdclass = {'precompress' : Precompress,
+                'build_py'    : Precompress_build_py,
+                'develop'     : Precompress_develop}
+
+    # pip install -e (PEP 660) on setuptools >= 64
+    try:
+        from setuptools.command.editable_wheel import editable_wheel
+    except ImportError:
+        return cmdclass
+
+    class Precompress_editable_wheel(editable_wheel):
+        def run(self):
+            precompress_files(directory)
+            editable_wheel.run(self)
+
+    cmdclass['editable_wheel'] = Precompress_editable_wheel
+    return cmdclass
@@ -161,6 +161,41 @@ class HistoricalValidationToolColombia(TethysAppBase):
                 url='get-zoom-array',
                 controller='historical_validation_tool_colombia.controllers.get_zoom_array',
             ),
+            UrlMap(
+                name='get_search_suggestions',
+                url='get-search-suggestions',
+                controller='historical_validation_tool_colombia.controllers.get_search_suggestions',
+            ),
+            UrlMap(
+                name='get_station_suggest',
+                url='get-station-suggest',
+                controller='historical_validation_tool_colombia.controllers.get_station_suggest',
+            ),
+            UrlMap(
+                name='get_spatial_search',
+                url='get-spatial-search',
+                controller='historical_validation_tool_colombia.controllers.get_spatial_search',
+            ),
+            UrlMap(
+                name='get_boundary',
+                url='get-boundary',
+                controller='historical_validation_tool_colombia.controllers.get_boundary',
+            ),
+            UrlMap(
+                name='get_skill',
+                url='get-skill',
+                controller='historical_validation_tool_colombia.controllers.get_skill',
+            ),
+            UrlMap(
+                name='get_metrics',
+                url='metrics',
+                controller='historical_validation_tool_colombia.controllers.get_metrics',
+            ),
+            UrlMap(
+                name='get_timing_stats',
+                url='timing-stats',
+                controller='historical_validation_tool_colombia.controllers.get_timing_stats',
+            ),
             ########################################################
             ########################################################
             UrlMap(
@@ -211,4 +246,10 @@ class HistoricalValidationToolColombia(TethysAppBase):
                 description='Hydroshare Password',
                 required=True,
             ),
+            CustomSetting(
+                name='metrics_token',
+                type=CustomSetting.TYPE_STRING,
+                description='Token of the metrics scraper (metrics and timing-stats are staff only without it)',
+                required=False,
+            ),
         )
@@ -1,95 +1,155 @@
 import datetime as dt
+import hmac
 import io
 import traceback
+from functools import wraps
 from csv import writer as csv_writer
 
-import geoglows
 import math
-import hydrostats as hs
-import hydrostats.data as hd
 import pandas as pd
 import numpy as np
-import requests
 import os
 import json
 import sys
-import plotly.graph_objs as go
-import scipy.stats as sp
-from HydroErr.HydroErr import metric_names, metric_abbr
 
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render
 from django.contrib import messages
-from scipy import integrate
 from tethys_sdk.gizmos import *
 
-import time
-from hs_restclient import HydroShare, HydroShareAuthBasic
+# geoglows, hydrostats, plotly, scipy, HydroErr and hs_restclient are imported
+# by the views that use them (first request), not when the worker boots
 from .app import HistoricalValidationToolColombia as app
 
 # Call model script (folder)
 # from .model import Model as model
-from .model import Stations_manage as stations
+from .model import get_stations, get_boundary_file, get_boundary_geojson, stage, timed, AVAILABLE_DATES, FILE_CACHE, TIMING_STATS
+from .model import CSV_EXPORTS, CSV_EXPORT_BYTES, METRICS, UPSTREAM, WORKSPACE_FILE_BYTES
+from .model import get_skill_layer
+from .model import clip_ensemble, ensemble_stats, naive_index, read_api_csv, read_forecast_ensemble
+from .model import get_scatter_data, hydrograph_figure, scatter_traces
 
+# Region used for the available dates of the home date picker
+HOME_DATES_REGION = 'central_america-geoglows'
 
-def home(request):
+# Regional validation results (scripts/validate_region.py), preferred first
+SKILL_RESULTS_FILES = ['validation_results.parquet', 'validation_results.csv']
+
+# Seconds of each upstream call of the forecast views (they run concurrently)
+# and of all of them (deadline of the request)
+FORECAST_DEADLINE = 120
+FORECAST_TIMEOUTS = {'ForecastStats'     : 60,
+                     'ForecastEnsembles' : 90,
+                     'ForecastRecords'   : 60,
+                     'ReturnPeriods'     : 30,
+                     'Qobs'              : 15}
+
+# Precompressed siblings (setup_helper.precompress_files), preferred first
+PRECOMPRESSED_ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def accepted_encodings(request):
     """
-    Controller for the app home page.
+    Content codings accepted by the client (Accept-Encoding without q=0)
     """
-    # Add foo_station/ Station_manage object to global variables
-    global foo_station
+    encodings = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.partition(';')
+        params = params.replace(' ', '')
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1
+        except ValueError:
+            quality = 1
+        if coding.strip() and quality > 0:
+            encodings.add(coding.strip().lower())
+    return encodings
 
-    # List of Metrics to include in context
-    metric_loop_list = list(zip(metric_names, metric_abbr))
 
-    # Retrieve a geoserver engine and geoserver credentials.
-    geoserver_engine = app.get_spatial_dataset_service(
-        name='main_geoserver', as_engine=True)
+def precompressed_file_response(request, path, content_type='application/json'):
+    """
+    File response that serves the up to date .br/.gz sibling of path when
+    the client accepts its encoding, the plain file otherwise
+    """
+    encodings = accepted_encodings(request)
 
-    geos_username = geoserver_engine.username
-    geos_password = geoserver_engine.password
-    my_geoserver = geoserver_engine.endpoint.replace('rest', '')
+    for encoding, ext in PRECOMPRESSED_ENCODINGS:
+        if (encoding in encodings or '*' in encodings) and os.path.isfile(path + ext) \
+                and os.path.getmtime(path + ext) >= os.path.getmtime(path):
+            response = FileResponse(open(path + ext, 'rb'), content_type=content_type)
+            response['Content-Encoding'] = encoding
+            break
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
 
-    geoserver_base_url = my_geoserver
-    geoserver_workspace = app.get_custom_setting('workspace')
-    region = app.get_custom_setting('region')
-    geoserver_endpoint = TextInput(display_text='',
-                                   initial=json.dumps([geoserver_base_url, geoserver_workspace, region]),
-                                   name='geoserver_endpoint',
-                                   disabled=True)
+    response['Vary'] = 'Accept-Encoding'
+    return response
 
-    # Available Forecast Dates
-    res = requests.get('https://geoglows.ecmwf.int/api/AvailableDates/?region=central_america-geoglows', verify=False)
-    data = res.json()
-    dates_array = (data.get('available_dates'))
 
-    dates = []
+def csv_export(export):
+    """
+    CSV download decorator: counts the exports and their size (metrics)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if response.get('Content-Type', '').startswith('text/csv'):
+                CSV_EXPORTS.inc(export=export)
+                CSV_EXPORT_BYTES.observe(len(response.content), export=export)
+            return response
+        return wrapper
+    return decorator
+
+
+def metrics_access(view):
+    """
+    Operational views decorator: staff users, or the scraper with the
+    metrics_token setting (Authorization: Bearer <token>)
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user = getattr(request, 'user', None)
+        allowed = user is not None and user.is_authenticated and user.is_staff
 
-    for date in dates_array:
-        if len(date) == 10:
-            date_mod = date + '000'
-            date_f = dt.datetime.strptime(date_mod, '%Y%m%d.%H%M').strftime('%Y-%m-%d %H:%M')
-        else:
-            date_f = dt.datetime.strptime(date, '%Y%m%d.%H%M').strftime('%Y-%m-%d')
-            date = date[:-3]
-        dates.append([date_f, date])
-        dates = sorted(dates)
+        token = app.get_custom_setting('metrics_token')
+        if not allowed and token:
+            auth = request.META.get('HTTP_AUTHORIZATION', '')
+            allowed = auth.startswith('Bearer ') and hmac.compare_digest(auth[7:].strip(), token)
 
-    dates.append(['Select Date', dates[-1][1]])
-    dates.reverse()
+        if not allowed:
+            return HttpResponseForbidden()
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def get_stations_catalog():
+    """
+    Station catalog (IDEAM_Stations_v2.json) shared read-only by the process
+    """
+    stations_file = os.path.join(app.get_app_workspace().path, 'IDEAM_Stations_v2.json')
+    return get_stations(path_dir=stations_file)
 
-    # Date Picker Options
-    date_picker = DatePicker(name='datesSelect',
-                             display_text='Date',
-                             autoclose=True,
-                             format='yyyy-mm-dd',
-                             start_date=dates[-1][0],
-                             end_date=dates[1][0],
-                             start_view='month',
-                             today_button=True,
-                             initial='')
 
-    region_index = json.load(open(os.path.join(os.path.dirname(__file__), 'public', 'geojson', 'index.json')))
+def get_home_static_context():
+    """
+    Static part of the home context (metrics, zoom selectors and search list).
+    Built once per process and rebuilt when its source files change.
+    """
+    index_files = [os.path.join(os.path.dirname(__file__), 'public', 'geojson', 'index.json'),
+                   os.path.join(os.path.dirname(__file__), 'public', 'geojson2', 'index2.json'),
+                   os.path.join(os.path.dirname(__file__), 'public', 'geojson3', 'index3.json')]
+    stations_file = os.path.join(app.get_app_workspace().path, 'IDEAM_Stations_v2.json')
+
+    return FILE_CACHE(key='home static context',
+                      paths=index_files + [stations_file],
+                      builder=lambda: build_home_static_context(*index_files))
+
+
+def build_home_static_context(region_file, basin_file, subbasin_file):
+    from HydroErr.HydroErr import metric_names, metric_abbr
+
+    with open(region_file) as f:
+        region_index = json.load(f)
     regions = SelectInput(
         display_text='Zoom al departamento:',
         name='regions',
@@ -101,13 +161,11 @@ def home(request):
     )
 
     # Load stations data (IDEAM_Stations_v2.json)
-    stations_file = os.path.join(os.path.join(app.get_app_workspace().path), 'IDEAM_Stations_v2.json')
-    foo_station = stations(path_dir=stations_file)
-
-    search_list = foo_station.search_list
+    search_list = get_stations_catalog().search_list
 
     # Select Basins
-    basin_index = json.load(open(os.path.join(os.path.dirname(__file__), 'public', 'geojson2', 'index2.json')))
+    with open(basin_file) as f:
+        basin_index = json.load(f)
     basins = SelectInput(
         display_text='Zoom a Z.H.:',
         name='basins',
@@ -119,7 +177,8 @@ def home(request):
     )
 
     # Select SubBasins
-    subbasin_index = json.load(open(os.path.join(os.path.dirname(__file__), 'public', 'geojson3', 'index3.json')))
+    with open(subbasin_file) as f:
+        subbasin_index = json.load(f)
     subbasins = SelectInput(
         display_text='Zoom a S.Z.H.',
         name='subbasins',
@@ -130,11 +189,9 @@ def home(request):
         select2_options={'placeholder': 'Seleccione S.Z.H.', 'allowClear': False}
     )
 
-
-    context = {
-        "metric_loop_list": metric_loop_list,
-        "geoserver_endpoint": geoserver_endpoint,
-        "date_picker": date_picker,
+    return {
+        # List of Metrics to include in context
+        "metric_loop_list": list(zip(metric_names, metric_abbr)),
         "regions" : regions,
 
         "search_list" : search_list,
@@ -143,14 +200,61 @@ def home(request):
         "subbasins" : subbasins,
     }
 
+
+def home(request):
+    """
+    Controller for the app home page.
+    """
+    # Retrieve a geoserver engine and geoserver credentials.
+    geoserver_engine = app.get_spatial_dataset_service(
+        name='main_geoserver', as_engine=True)
+
+    geos_username = geoserver_engine.username
+    geos_password = geoserver_engine.password
+    my_geoserver = geoserver_engine.endpoint.replace('rest', '')
+
+    geoserver_base_url = my_geoserver
+    geoserver_workspace = app.get_custom_setting('workspace')
+    region = app.get_custom_setting('region')
+    geoserver_endpoint = TextInput(display_text='',
+                                   initial=json.dumps([geoserver_base_url, geoserver_workspace, region]),
+                                   name='geoserver_endpoint',
+                                   disabled=True)
+
+    # Available Forecast Dates
+    dates = [list(date) for date in AVAILABLE_DATES(HOME_DATES_REGION)]
+
+    date_limits = {}
+    if len(dates) > 0:
+        dates.append(['Select Date', dates[-1][1]])
+        dates.reverse()
+        date_limits = {'start_date': dates[-1][0], 'end_date': dates[1][0]}
+
+    # Date Picker Options
+    date_picker = DatePicker(name='datesSelect',
+                             display_text='Date',
+                             autoclose=True,
+                             format='yyyy-mm-dd',
+                             start_view='month',
+                             today_button=True,
+                             initial='',
+                             **date_limits)
+
+    context = {
+        "geoserver_endpoint": geoserver_endpoint,
+        "date_picker": date_picker,
+    }
+    context.update(get_home_static_context())
+
     return render(request, 'historical_validation_tool_colombia/home.html', context)
 
+@timed
 def get_popup_response(request):
     """
     get station attributes
     """
-
-    start_time = time.time()
+    import geoglows
+    from hs_restclient import HydroShare, HydroShareAuthBasic
 
     observed_data_path_file = os.path.join(app.get_app_workspace().path, 'observed_data.json')
     simulated_data_path_file = os.path.join(app.get_app_workspace().path, 'simulated_data.json')
@@ -178,13 +282,14 @@ def get_popup_response(request):
         nomEstacion = get_data['stationname']
 
         '''Get Observed Data'''
+        stage('fetch_observed')
         auth = HydroShareAuthBasic(username=app.get_custom_setting('username'), password=app.get_custom_setting('password'))
         hs = HydroShare(auth=auth)
         resource_id = app.get_custom_setting('hydroshare_resource_id')
-        hs.setAccessRules(resource_id, public=True)
+        UPSTREAM.call('hydroshare', 'setAccessRules', hs.setAccessRules, resource_id, public=True)
 
         url = 'https://www.hydroshare.org/resource/{0}/data/contents/Discharge_Data/{1}.csv'.format(resource_id, codEstacion)
-        s = requests.get(url, verify=False).content
+        s = UPSTREAM.get('hydroshare', 'Discharge_Data', url, verify=False).content
         df = pd.read_csv(io.StringIO(s.decode('utf-8')), index_col=0)
         df.index = pd.to_datetime(df.index)
 
@@ -206,7 +311,9 @@ def get_popup_response(request):
         observed_df.to_json(observed_data_file_path, orient='columns')
 
         '''Get Simulated Data'''
-        simulated_df = geoglows.streamflow.historic_simulation(comid, forcing='era_5', return_format='csv')
+        stage('fetch_simulated')
+        simulated_df = UPSTREAM.call('geoglows', 'HistoricSimulation', geoglows.streamflow.historic_simulation,
+                                     comid, forcing='era_5', return_format='csv')
         # Removing Negative Values
         simulated_df[simulated_df < 0] = 0
         simulated_df.index = pd.to_datetime(simulated_df.index)
@@ -224,8 +331,6 @@ def get_popup_response(request):
 
         print("finished get_popup_response")
 
-        print("--- %s seconds getpopup ---" % (time.time() - start_time))
-
         return JsonResponse({})
 
 
@@ -238,13 +343,13 @@ def get_popup_response(request):
         })
 
 
+@timed
 def get_hydrographs(request):
     """
     Get observed data from csv files in Hydroshare
     Get historic simulations from ERA Interim
     """
-
-    start_time = time.time()
+    import geoglows
 
     try:
 
@@ -256,18 +361,21 @@ def get_hydrographs(request):
         nomEstacion = get_data['stationname']
 
         '''Get Observed Data'''
+        stage('read_cache')
         observed_data_file_path = os.path.join(app.get_app_workspace().path, 'observed_data.json')
         observed_df = pd.read_json(observed_data_file_path,convert_dates=True)
         observed_df.index = pd.to_datetime(observed_df.index, unit='ms')
         observed_df.sort_index(inplace=True, ascending=True)
 
         '''Get Simulated Data'''
+        stage('read_cache')
         simulated_data_file_path = os.path.join(app.get_app_workspace().path, 'simulated_data.json')
         simulated_df = pd.read_json(simulated_data_file_path, convert_dates=True)
         simulated_df.index = pd.to_datetime(simulated_df.index)
         simulated_df.sort_index(inplace=True, ascending=True)
 
         '''Correct the Bias in Sumulation'''
+        stage('bias_correct')
         corrected_df = geoglows.bias.correct_historical(simulated_df, observed_df)
         corrected_data_file_path = os.path.join(app.get_app_workspace().path, 'corrected_data.json')
         corrected_df.reset_index(level=0, inplace=True)
@@ -278,23 +386,13 @@ def get_hydrographs(request):
         corrected_df.to_json(corrected_data_file_path)
 
         '''Plotting Data'''
-        observed_Q = go.Scatter(x=observed_df.index, y=observed_df.iloc[:, 0].values, name='Observed', )
-        simulated_Q = go.Scatter(x=simulated_df.index, y=simulated_df.iloc[:, 0].values, name='Simulated', )
-        corrected_Q = go.Scatter(x=corrected_df.index, y=corrected_df.iloc[:, 0].values, name='Corrected Simulated', )
-
-        layout = go.Layout(
-            title='Observed & Simulated Streamflow at <br> {0} - {1}'.format(codEstacion, nomEstacion),
-            xaxis=dict(title='Dates', ), yaxis=dict(title='Discharge (m<sup>3</sup>/s)', autorange=True),
-            showlegend=True)
-
-        chart_obj = PlotlyView(go.Figure(data=[observed_Q, simulated_Q, corrected_Q], layout=layout))
+        stage('render')
+        chart_obj = PlotlyView(hydrograph_figure(observed_df, simulated_df, corrected_df, codEstacion, nomEstacion))
 
         context = {
             'gizmo_object': chart_obj,
         }
 
-        print("--- %s seconds hydrographs ---" % (time.time() - start_time))
-
         return render(request, 'historical_validation_tool_colombia/gizmo_ajax.html', context)
 
     except Exception as e:
@@ -306,13 +404,14 @@ def get_hydrographs(request):
         })
 
 
+@timed
 def get_dailyAverages(request):
     """
     Get observed data from csv files in Hydroshare
     Get historic simulations from ERA Interim
     """
-
-    start_time = time.time()
+    import hydrostats.data as hd
+    import plotly.graph_objs as go
 
     try:
         get_data = request.GET
@@ -323,30 +422,35 @@ def get_dailyAverages(request):
         nomEstacion = get_data['stationname']
 
         '''Get Observed Data'''
+        stage('read_cache')
         observed_data_file_path = os.path.join(app.get_app_workspace().path, 'observed_data.json')
         observed_df = pd.read_json(observed_data_file_path,convert_dates=True)
         observed_df.index = pd.to_datetime(observed_df.index, unit='ms')
         observed_df.sort_index(inplace=True, ascending=True)
 
         '''Get Simulated Data'''
+        stage('read_cache')
         simulated_data_file_path = os.path.join(app.get_app_workspace().path, 'simulated_data.json')
         simulated_df = pd.read_json(simulated_data_file_path, convert_dates=True)
         simulated_df.index = pd.to_datetime(simulated_df.index)
         simulated_df.sort_index(inplace=True, ascending=True)
 
         '''Get Bias Corrected Data'''
+        stage('read_cache')
         corrected_data_file_path = os.path.join(app.get_app_workspace().path, 'corrected_data.json')
         corrected_df = pd.read_json(corrected_data_file_path,convert_dates=True)
         corrected_df.index = pd.to_datetime(corrected_df.index)
         corrected_df.sort_index(inplace=True, ascending=True)
 
         '''Merge Data'''
+        stage('merge')
 
         merged_df = hd.merge_data(sim_df=simulated_df, obs_df=observed_df)
 
         merged_df2 = hd.merge_data(sim_df=corrected_df, obs_df=observed_df)
 
         '''Plotting Data'''
+        stage('render')
 
         daily_avg = hd.daily_average(merged_df)
 
@@ -370,8 +474,6 @@ def get_dailyAverages(request):
             'gizmo_object': chart_obj,
         }
 
-        print("--- %s seconds dailyAverages ---" % (time.time() - start_time))
-
         return render(request, 'historical_validation_tool_colombia/gizmo_ajax.html', context)
 
 
@@ -384,13 +486,14 @@ def get_dailyAverages(request):
         })
 
 
+@timed
 def get_monthlyAverages(request):
     """
     Get observed data from csv files in Hydroshare
     Get historic simulations from ERA Interim
     """
-
-    start_time = time.time()
+    import hydrostats.data as hd
+    import plotly.graph_objs as go
 
     try:
         get_data = request.GET
@@ -401,30 +504,35 @@ def get_monthlyAverages(request):
         nomEstacion = get_data['stationname']
 
         '''Get Observed Data'''
+        stage('read_cache')
         observed_data_file_path = os.path.join(app.get_app_workspace().path, 'observed_data.json')
         observed_df = pd.read_json(observed_data_file_path,convert_dates=True)
         observed_df.index = pd.to_datetime(observed_df.index, unit='ms')
         observed_df.sort_index(inplace=True, ascending=True)
 
         '''Get Simulated Data'''
+        stage('read_cache')
         simulated_data_file_path = os.path.join(app.get_app_workspace().path, 'simulated_data.json')
         simulated_df = pd.read_json(simulated_data_file_path, convert_dates=True)
         simulated_df.index = pd.to_datetime(simulated_df.index)
         simulated_df.sort_index(inplace=True, ascending=True)
 
         '''Get Bias Corrected Data'''
+        stage('read_cache')
         corrected_data_file_path = os.path.join(app.get_app_workspace().path, 'corrected_data.json')
         corrected_df = pd.read_json(corrected_data_file_path,convert_dates=True)
         corrected_df.index = pd.to_datetime(corrected_df.index)
         corrected_df.sort_index(inplace=True, ascending=True)
 
         '''Merge Data'''
+        stage('merge')
 
         merged_df = hd.merge_data(sim_df=simulated_df, obs_df=observed_df)
 
         merged_df2 = hd.merge_data(sim_df=corrected_df, obs_df=observed_df)
 
         '''Plotting Data'''
+        stage('render')
 
         monthly_avg = hd.monthly_average(merged_df)
 
@@ -449,8 +557,6 @@ def get_monthlyAverages(request):
             'gizmo_object': chart_obj,
         }
 
-        print("--- %s seconds monthlyAverages ---" % (time.time() - start_time))
-
         return render(request, 'historical_validation_tool_colombia/gizmo_ajax.html', context)
 
     except Exception as e:
@@ -462,13 +568,13 @@ def get_monthlyAverages(request):
         })
 
 
+@timed
 def get_scatterPlot(request):
     """
     Get observed data from csv files in Hydroshare
     Get historic simulations from ERA Interim
     """
-
-    start_time = time.time()
+    import plotly.graph_objs as go
 
     try:
         get_data = request.GET
@@ -477,54 +583,20 @@ def get_scatterPlot(request):
         comid = get_data['streamcomid']
         codEstacion = get_data['stationcode']
         nomEstacion = get_data['stationname']
+        mode = get_data.get('mode', 'auto')
 
-        '''Get Observed Data'''
-        observed_data_file_path = os.path.join(app.get_app_workspace().path, 'observed_data.json')
-        observed_df = pd.read_json(observed_data_file_path,convert_dates=True)
-        observed_df.index = pd.to_datetime(observed_df.index, unit='ms')
-        observed_df.sort_index(inplace=True, ascending=True)
-
-        '''Get Simulated Data'''
-        simulated_data_file_path = os.path.join(app.get_app_workspace().path, 'simulated_data.json')
-        simulated_df = pd.read_json(simulated_data_file_path, convert_dates=True)
-        simulated_df.index = pd.to_datetime(simulated_df.index)
-        simulated_df.sort_index(inplace=True, ascending=True)
-
-        '''Get Bias Corrected Data'''
-        corrected_data_file_path = os.path.join(app.get_app_workspace().path, 'corrected_data.json')
-        corrected_df = pd.read_json(corrected_data_file_path,convert_dates=True)
-        corrected_df.index = pd.to_datetime(corrected_df.index)
-        corrected_df.sort_index(inplace=True, ascending=True)
-
-        '''Merge Data'''
-
-        merged_df = hd.merge_data(sim_df=simulated_df, obs_df=observed_df)
-
-        merged_df2 = hd.merge_data(sim_df=corrected_df, obs_df=observed_df)
+        '''Get Observed, Simulated and Bias Corrected Data (merged, with fits)'''
+        stage('read_cache')
+        scatter = get_scatter_data(app.get_app_workspace().path)
 
         '''Plotting Data'''
+        stage('render')
 
-        scatter_data = go.Scatter(
-            x=merged_df.iloc[:, 0].values,
-            y=merged_df.iloc[:, 1].values,
-            mode='markers',
-            name='original',
-            marker=dict(color='#ef553b')
-        )
-
-        scatter_data2 = go.Scatter(
-            x=merged_df2.iloc[:, 0].values,
-            y=merged_df2.iloc[:, 1].values,
-            mode='markers',
-            name='corrected',
-            marker=dict(color='#00cc96')
-        )
-
-        min_value = min(min(merged_df.iloc[:, 1].values), min(merged_df.iloc[:, 0].values))
-        max_value = max(max(merged_df.iloc[:, 1].values), max(merged_df.iloc[:, 0].values))
+        scatter_data, scatter_data2 = scatter_traces(scatter, log=False, mode=mode)
 
-        min_value2 = min(min(merged_df2.iloc[:, 1].values), min(merged_df2.iloc[:, 0].values))
-        max_value2 = max(max(merged_df2.iloc[:, 1].values), max(merged_df2.iloc[:, 0].values))
+        fit = scatter.fit['original']
+        fit2 = scatter.fit['corrected']
+        min_value, max_value = fit['min'], fit['max']
 
         line_45 = go.Scatter(
             x=[min_value, max_value],
@@ -534,25 +606,19 @@ def get_scatterPlot(request):
             line=dict(color='black')
         )
 
-        slope, intercept, r_value, p_value, std_err = sp.linregress(merged_df.iloc[:, 0].values,
-                                                                    merged_df.iloc[:, 1].values)
-
-        slope2, intercept2, r_value2, p_value2, std_err2 = sp.linregress(merged_df2.iloc[:, 0].values,
-                                                                         merged_df2.iloc[:, 1].values)
-
         line_adjusted = go.Scatter(
             x=[min_value, max_value],
-            y=[slope * min_value + intercept, slope * max_value + intercept],
+            y=[fit['slope'] * min_value + fit['intercept'], fit['slope'] * max_value + fit['intercept']],
             mode='lines',
-            name='{0}x + {1} (Original)'.format(str(round(slope, 2)), str(round(intercept, 2))),
+            name='{0}x + {1} (Original)'.format(str(round(fit['slope'], 2)), str(round(fit['intercept'], 2))),
             line=dict(color='red')
         )
 
         line_adjusted2 = go.Scatter(
             x=[min_value, max_value],
-            y=[slope2 * min_value + intercept2, slope2 * max_value + intercept2],
+            y=[fit2['slope'] * min_value + fit2['intercept'], fit2['slope'] * max_value + fit2['intercept']],
             mode='lines',
-            name='{0}x + {1} (Corrected)'.format(str(round(slope2, 2)), str(round(intercept2, 2))),
+            name='{0}x + {1} (Corrected)'.format(str(round(fit2['slope'], 2)), str(round(fit2['intercept'], 2))),
             line=dict(color='green')
         )
 
@@ -567,8 +633,6 @@ def get_scatterPlot(request):
             'gizmo_object': chart_obj,
         }
 
-        print("--- %s seconds scatterPlot ---" % (time.time() - start_time))
-
         return render(request, 'historical_validation_tool_colombia/gizmo_ajax.html', context)
 
     except Exception as e:
@@ -580,13 +644,13 @@ def get_scatterPlot(request):
         })
 
 
+@timed
 def get_scatterPlotLogScale(request):
     """
     Get observed data from csv files in Hydroshare
     Get historic simulations from ERA Interim
     """
-
-    start_time = time.time()
+    import plotly.graph_objs as go
 
     try:
         get_data = request.GET
@@ -595,51 +659,18 @@ def get_scatterPlotLogScale(request):
         comid = get_data['streamcomid']
         codEstacion = get_data['stationcode']
         nomEstacion = get_data['stationname']
+        mode = get_data.get('mode', 'auto')
 
-        '''Get Observed Data'''
-        observed_data_file_path = os.path.join(app.get_app_workspace().path, 'observed_data.json')
-        observed_df = pd.read_json(observed_data_file_path,convert_dates=True)
-        observed_df.index = pd.to_datetime(observed_df.index, unit='ms')
-        observed_df.sort_index(inplace=True, ascending=True)
-
-        '''Get Simulated Data'''
-        simulated_data_file_path = os.path.join(app.get_app_workspace().path, 'simulated_data.json')
-        simulated_df = pd.read_json(simulated_data_file_path, convert_dates=True)
-        simulated_df.index = pd.to_datetime(simulated_df.index)
-        simulated_df.sort_index(inplace=True, ascending=True)
-
-        '''Get Bias Corrected Data'''
-        corrected_data_file_path = os.path.join(app.get_app_workspace().path, 'corrected_data.json')
-        corrected_df = pd.read_json(corrected_data_file_path,convert_dates=True)
-        corrected_df.index = pd.to_datetime(corrected_df.index)
-        corrected_df.sort_index(inplace=True, ascending=True)
-
-        '''Merge Data'''
-
-        merged_df = hd.merge_data(sim_df=simulated_df, obs_df=observed_df)
-
-        merged_df2 = hd.merge_data(sim_df=corrected_df, obs_df=observed_df)
+        '''Get Observed, Simulated and Bias Corrected Data (merged, with fits)'''
+        stage('read_cache')
+        scatter = get_scatter_data(app.get_app_workspace().path)
 
         '''Plotting Data'''
+        stage('render')
 
-        scatter_data = go.Scatter(
-            x=merged_df.iloc[:, 0].values,
-            y=merged_df.iloc[:, 1].values,
-            mode='markers',
-            name='original',
-            marker=dict(color='#ef553b')
-        )
+        scatter_data, scatter_data2 = scatter_traces(scatter, log=True, mode=mode)
 
-        scatter_data2 = go.Scatter(
-            x=merged_df2.iloc[:, 0].values,
-            y=merged_df2.iloc[:, 1].values,
-            mode='markers',
-            name='corrected',
-            marker=dict(color='#00cc96')
-        )
-
-        min_value = min(min(merged_df.iloc[:, 1].values), min(merged_df.iloc[:, 0].values))
-        max_value = max(max(merged_df.iloc[:, 1].values), max(merged_df.iloc[:, 0].values))
+        min_value, max_value = scatter.fit['original']['min'], scatter.fit['original']['max']
 
         line_45 = go.Scatter(
             x=[min_value, max_value],
@@ -659,8 +690,6 @@ def get_scatterPlotLogScale(request):
             'gizmo_object': chart_obj,
         }
 
-        print("--- %s seconds scatterPlot_log ---" % (time.time() - start_time))
-
         return render(request, 'historical_validation_tool_colombia/gizmo_ajax.html', context)
 
     except Exception as e:
@@ -671,13 +700,14 @@ def get_scatterPlotLogScale(request):
             'error': f'{"error: " + str(e), "line: " + str(exc_tb.tb_lineno)}',
         })
 
+@timed
 def get_volumeAnalysis(request):
     """
     Get observed data from csv files in Hydroshare
     Get historic simulations from ERA Interim
     """
-
-    start_time = time.time()
+    import hydrostats.data as hd
+    import plotly.graph_objs as go
 
     try:
         get_data = request.GET
@@ -688,30 +718,35 @@ def get_volumeAnalysis(request):
         nomEstacion = get_data['stationname']
 
         '''Get Observed Data'''
+        stage('read_cache')
         observed_data_file_path = os.path.join(app.get_app_workspace().path, 'observed_data.json')
         observed_df = pd.read_json(observed_data_file_path,convert_dates=True)
         observed_df.index = pd.to_datetime(observed_df.index, unit='ms')
         observed_df.sort_index(inplace=True, ascending=True)
 
         '''Get Simulated Data'''
+        stage('read_cache')
         simulated_data_file_path = os.path.join(app.get_app_workspace().path, 'simulated_data.json')
         simulated_df = pd.read_json(simulated_data_file_path, convert_dates=True)
         simulated_df.index = pd.to_datetime(simulated_df.index)
         simulated_df.sort_index(inplace=True, ascending=True)
 
         '''Get Bias Corrected Data'''
+        stage('read_cache')
         corrected_data_file_path = os.path.join(app.get_app_workspace().path, 'corrected_data.json')
         corrected_df = pd.read_json(corrected_data_file_path,convert_dates=True)
         corrected_df.index = pd.to_datetime(corrected_df.index)
         corrected_df.sort_index(inplace=True, ascending=True)
 
         '''Merge Data'''
+        stage('merge')
 
         merged_df = hd.merge_data(sim_df=simulated_df, obs_df=observed_df)
 
         merged_df2 = hd.merge_data(sim_df=corrected_df, obs_df=observed_df)
 
         '''Plotting Data'''
+        stage('render')
 
         sim_array = merged_df.iloc[:, 0].values
         obs_array = merged_df.iloc[:, 1].values
@@ -753,8 +788,6 @@ def get_volumeAnalysis(request):
 
         chart_obj = PlotlyView(go.Figure(data=[observed_volume, simulated_volume, corrected_volume], layout=layout))
 
-        print("--- %s seconds volumeAnalysis ---" % (time.time() - start_time))
-
         context = {
             'gizmo_object': chart_obj,
         }
@@ -770,11 +803,12 @@ def get_volumeAnalysis(request):
         })
 
 
+@timed
 def volume_table_ajax(request):
     """Calculates the volumes of the simulated and
     observed streamflow"""
-
-    start_time = time.time()
+    import hydrostats.data as hd
+    from scipy import integrate
 
     try:
         get_data = request.GET
@@ -785,30 +819,35 @@ def volume_table_ajax(request):
         nomEstacion = get_data['stationname']
 
         '''Get Observed Data'''
+        stage('read_cache')
         observed_data_file_path = os.path.join(app.get_app_workspace().path, 'observed_data.json')
         observed_df = pd.read_json(observed_data_file_path, convert_dates=True)
         observed_df.index = pd.to_datetime(observed_df.index, unit='ms')
         observed_df.sort_index(inplace=True, ascending=True)
 
         '''Get Simulated Data'''
+        stage('read_cache')
         simulated_data_file_path = os.path.join(app.get_app_workspace().path, 'simulated_data.json')
         simulated_df = pd.read_json(simulated_data_file_path, convert_dates=True)
         simulated_df.index = pd.to_datetime(simulated_df.index)
         simulated_df.sort_index(inplace=True, ascending=True)
 
         '''Get Bias Corrected Data'''
+        stage('read_cache')
         corrected_data_file_path = os.path.join(app.get_app_workspace().path, 'corrected_data.json')
         corrected_df = pd.read_json(corrected_data_file_path, convert_dates=True)
         corrected_df.index = pd.to_datetime(corrected_df.index)
         corrected_df.sort_index(inplace=True, ascending=True)
 
         '''Merge Data'''
+        stage('merge')
 
         merged_df = hd.merge_data(sim_df=simulated_df, obs_df=observed_df)
 
         merged_df2 = hd.merge_data(sim_df=corrected_df, obs_df=observed_df)
 
         '''Plotting Data'''
+        stage('metrics')
 
         sim_array = merged_df.iloc[:, 0].values
         obs_array = merged_df.iloc[:, 1].values
@@ -824,8 +863,6 @@ def volume_table_ajax(request):
             "corr_volume": corr_volume,
         }
 
-        print("--- %s seconds volumeAnalysis_table ---" % (time.time() - start_time))
-
         return JsonResponse(resp)
 
     except Exception as e:
@@ -838,9 +875,10 @@ def volume_table_ajax(request):
 
 
 # Metric report
+@timed
 def make_table_ajax(request):
-
-    start_time = time.time()
+    import hydrostats as hs
+    import hydrostats.data as hd
 
     try:
         get_data = request.GET
@@ -914,28 +952,33 @@ def make_table_ajax(request):
             extra_param_dict['d1_p_x_bar_p'] = d1_p_x_bar_p
 
         '''Get Observed Data'''
+        stage('read_cache')
         observed_data_file_path = os.path.join(app.get_app_workspace().path, 'observed_data.json')
         observed_df = pd.read_json(observed_data_file_path,convert_dates=True)
         observed_df.index = pd.to_datetime(observed_df.index, unit='ms')
         observed_df.sort_index(inplace=True, ascending=True)
 
         '''Get Simulated Data'''
+        stage('read_cache')
         simulated_data_file_path = os.path.join(app.get_app_workspace().path, 'simulated_data.json')
         simulated_df = pd.read_json(simulated_data_file_path, convert_dates=True)
         simulated_df.index = pd.to_datetime(simulated_df.index)
         simulated_df.sort_index(inplace=True, ascending=True)
 
         '''Get Bias Corrected Data'''
+        stage('read_cache')
         corrected_data_file_path = os.path.join(app.get_app_workspace().path, 'corrected_data.json')
         corrected_df = pd.read_json(corrected_data_file_path,convert_dates=True)
         corrected_df.index = pd.to_datetime(corrected_df.index)
         corrected_df.sort_index(inplace=True, ascending=True)
 
         '''Merge Data'''
+        stage('merge')
         merged_df = hd.merge_data(sim_df=simulated_df, obs_df=observed_df)
         merged_df2 = hd.merge_data(sim_df=corrected_df, obs_df=observed_df)
 
         '''Plotting Data'''
+        stage('metrics')
 
         # Creating the Table Based on User Input
         table = hs.make_table(
@@ -987,8 +1030,6 @@ def make_table_ajax(request):
         table_final_html = table_final.to_html(classes="table table-hover table-striped",
                                                table_id="corrected_1").replace('border="1"', 'border="0"')
 
-        print("--- %s seconds metrics_table ---" % (time.time() - start_time))
-
         return HttpResponse(table_final_html)
 
     except Exception as e:
@@ -1010,9 +1051,12 @@ def get_units_title(unit_type):
     return units_title
 
 
+@timed
 def get_time_series(request):
+    import geoglows
+    import plotly.graph_objs as go
 
-    start_time = time.time()
+    batch = UPSTREAM.batch(deadline=FORECAST_DEADLINE)
 
     try:
         get_data = request.GET
@@ -1024,12 +1068,26 @@ def get_time_series(request):
         startdate = get_data['startdate']
 
         '''Getting Forecast Stats'''
+        stage('fetch_forecast')
         if startdate != '':
-            res = requests.get('https://geoglows.ecmwf.int/api/ForecastStats/?reach_id=' + comid + '&date=' + startdate + '&return_format=csv', verify=False).content
+            url = 'https://geoglows.ecmwf.int/api/ForecastStats/?reach_id=' + comid + '&date=' + startdate + '&return_format=csv'
         else:
-            res = requests.get('https://geoglows.ecmwf.int/api/ForecastStats/?reach_id=' + comid + '&return_format=csv', verify=False).content
+            url = 'https://geoglows.ecmwf.int/api/ForecastStats/?reach_id=' + comid + '&return_format=csv'
+        url_rt = 'http://fews.ideam.gov.co/colombia/jsonQ/00' + codEstacion + 'Qobs.json'
+
+        url_records = 'https://geoglows.ecmwf.int/api/ForecastRecords/?reach_id=' + comid + '&return_format=csv'
+        url_rperiods = 'https://geoglows.ecmwf.int/api/ReturnPeriods/?reach_id=' + comid + '&return_format=csv'
+
+        # The upstream calls are independent -> all of them start now
+        forecast_job = batch.get('geoglows', 'ForecastStats', url, FORECAST_TIMEOUTS['ForecastStats'], verify=False)
+        record_job = batch.get('geoglows', 'ForecastRecords', url_records, FORECAST_TIMEOUTS['ForecastRecords'], verify=False)
+        observed_rt_job = batch.get('ideam_fews', 'Qobs', url_rt, FORECAST_TIMEOUTS['Qobs'], verify=False)
+        rperiods_job = batch.get('geoglows', 'ReturnPeriods', url_rperiods, FORECAST_TIMEOUTS['ReturnPeriods'], verify=False)
+
+        res = batch.result(forecast_job).content
 
         '''Get Forecasts'''
+        stage('parse_forecast')
         forecast_df = pd.read_csv(io.StringIO(res.decode('utf-8')), index_col=0)
         forecast_df.index = pd.to_datetime(forecast_df.index)
         forecast_df[forecast_df < 0] = 0
@@ -1046,8 +1104,11 @@ def get_time_series(request):
         max_visible = max(forecast_df.max())
 
         '''Getting forecast record'''
+        stage('fetch_records')
 
-        forecast_record = geoglows.streamflow.forecast_records(comid)
+        forecast_record = batch.result(record_job)
+        forecast_record.raise_for_status()
+        forecast_record = read_api_csv(forecast_record.content)
         forecast_record[forecast_record < 0] = 0
         forecast_record.index = forecast_record.index.to_series().dt.strftime("%Y-%m-%d %H:%M:%S")
         forecast_record.index = pd.to_datetime(forecast_record.index)
@@ -1070,10 +1131,15 @@ def get_time_series(request):
             max_visible = max(record_plot.max().values[0], max_visible)
 
         '''Getting real time observed data'''
-        url_rt = 'http://fews.ideam.gov.co/colombia/jsonQ/00' + codEstacion + 'Qobs.json'
-        f = requests.get(url_rt, verify=False)
+        stage('fetch_observed_rt')
+        # Optional feed: a timeout or a failed request is the same as a non 200 answer
+        try:
+            f = batch.result(observed_rt_job)
+        except Exception as e:
+            print(str(e))
+            f = None
 
-        if f.status_code == 200:
+        if f is not None and f.status_code == 200:
             data = f.json()
 
             observedDischarge = (data.get('obs'))
@@ -1181,9 +1247,12 @@ def get_time_series(request):
                 print(str(e))
 
         '''Getting Return Periods'''
+        stage('return_periods')
 
         try:
-            rperiods = geoglows.streamflow.return_periods(comid)
+            rperiods = batch.result(rperiods_job)
+            rperiods.raise_for_status()
+            rperiods = read_api_csv(rperiods.content, dates=False)
 
             r2 = int(rperiods.iloc[0]['return_period_2'])
 
@@ -1236,14 +1305,13 @@ def get_time_series(request):
         except Exception as e:
             print(str(e))
 
+        stage('render')
         chart_obj = PlotlyView(hydroviewer_figure)
 
         context = {
             'gizmo_object': chart_obj,
         }
 
-        print("--- %s seconds forecasts ---" % (time.time() - start_time))
-
         return render(request, 'historical_validation_tool_colombia/gizmo_ajax.html', context)
 
     except Exception as e:
@@ -1253,11 +1321,16 @@ def get_time_series(request):
         return JsonResponse({
             'error': f'{"error: " + str(e), "line: " + str(exc_tb.tb_lineno)}',
         })
+    finally:
+        batch.close()
 
 
+@timed
 def get_time_series_bc(request):
+    import geoglows
+    import plotly.graph_objs as go
 
-    start_time = time.time()
+    batch = UPSTREAM.batch(deadline=FORECAST_DEADLINE)
 
     try:
 
@@ -1270,114 +1343,79 @@ def get_time_series_bc(request):
         startdate = get_data['startdate']
 
         '''Get Observed Data'''
+        stage('read_cache')
         observed_data_file_path = os.path.join(app.get_app_workspace().path, 'observed_data.json')
         observed_df = pd.read_json(observed_data_file_path, convert_dates=True)
         observed_df.index = pd.to_datetime(observed_df.index, unit='ms')
         observed_df.sort_index(inplace=True, ascending=True)
 
         '''Get Simulated Data'''
+        stage('read_cache')
         simulated_data_file_path = os.path.join(app.get_app_workspace().path, 'simulated_data.json')
         simulated_df = pd.read_json(simulated_data_file_path, convert_dates=True)
         simulated_df.index = pd.to_datetime(simulated_df.index)
         simulated_df.sort_index(inplace=True, ascending=True)
 
         '''Get Bias Corrected Data'''
+        stage('read_cache')
         corrected_data_file_path = os.path.join(app.get_app_workspace().path, 'corrected_data.json')
         corrected_df = pd.read_json(corrected_data_file_path, convert_dates=True)
         corrected_df.index = pd.to_datetime(corrected_df.index)
         corrected_df.sort_index(inplace=True, ascending=True)
 
         '''Getting Forecast Stats'''
+        stage('fetch_forecast')
         if startdate != '':
-            res = requests.get('https://geoglows.ecmwf.int/api/ForecastEnsembles/?reach_id=' + comid + '&date=' + startdate + '&return_format=csv', verify=False).content
+            url = 'https://geoglows.ecmwf.int/api/ForecastEnsembles/?reach_id=' + comid + '&date=' + startdate + '&return_format=csv'
         else:
-            res = requests.get('https://geoglows.ecmwf.int/api/ForecastEnsembles/?reach_id=' + comid + '&return_format=csv', verify=False).content
+            url = 'https://geoglows.ecmwf.int/api/ForecastEnsembles/?reach_id=' + comid + '&return_format=csv'
+        url_rt = 'http://fews.ideam.gov.co/colombia/jsonQ/00' + codEstacion + 'Qobs.json'
+
+        url_records = 'https://geoglows.ecmwf.int/api/ForecastRecords/?reach_id=' + comid + '&return_format=csv'
+
+        # The upstream calls are independent -> all of them start now
+        forecast_job = batch.get('geoglows', 'ForecastEnsembles', url, FORECAST_TIMEOUTS['ForecastEnsembles'], verify=False)
+        record_job = batch.get('geoglows', 'ForecastRecords', url_records, FORECAST_TIMEOUTS['ForecastRecords'], verify=False)
+        observed_rt_job = batch.get('ideam_fews', 'Qobs', url_rt, FORECAST_TIMEOUTS['Qobs'], verify=False)
+
+        res = batch.result(forecast_job).content
 
         '''Get Forecasts'''
-        forecast_ens = pd.read_csv(io.StringIO(res.decode('utf-8')), index_col=0)
-        forecast_ens.index = pd.to_datetime(forecast_ens.index)
-        forecast_ens[forecast_ens < 0] = 0
-        forecast_ens.index = forecast_ens.index.to_series().dt.strftime("%Y-%m-%d %H:%M:%S")
-        forecast_ens.index = pd.to_datetime(forecast_ens.index)
+        stage('parse_forecast')
+        forecast_ens = read_forecast_ensemble(res)
 
         forecast_ens_file_path = os.path.join(app.get_app_workspace().path, 'forecast_ens.json')
-        forecast_ens.index.name = 'Datetime'
         forecast_ens.to_json(forecast_ens_file_path)
 
         '''Get Forecasts Records'''
-        forecast_record = geoglows.streamflow.forecast_records(comid)
+        stage('fetch_records')
+        forecast_record = batch.result(record_job)
+        forecast_record.raise_for_status()
+        forecast_record = read_api_csv(forecast_record.content)
         forecast_record[forecast_record < 0] = 0
-        forecast_record.index = forecast_record.index.to_series().dt.strftime("%Y-%m-%d %H:%M:%S")
-        forecast_record.index = pd.to_datetime(forecast_record.index)
+        forecast_record.index = naive_index(forecast_record.index)
 
         '''Correct Bias Forecasts'''
+        stage('bias_correct')
         monthly_simulated = simulated_df[simulated_df.index.month == (forecast_ens.index[0]).month].dropna()
         monthly_observed = observed_df[observed_df.index.month == (forecast_ens.index[0]).month].dropna()
 
         min_simulated = np.min(monthly_simulated.iloc[:, 0].to_list())
         max_simulated = np.max(monthly_simulated.iloc[:, 0].to_list())
 
-        min_factor_df = forecast_ens.copy()
-        max_factor_df = forecast_ens.copy()
-        forecast_ens_df = forecast_ens.copy()
-
-        for column in forecast_ens.columns:
-            tmp = forecast_ens[column].dropna().to_frame()
-            min_factor = tmp.copy()
-            max_factor = tmp.copy()
-            min_factor.loc[min_factor[column] >= min_simulated, column] = 1
-            min_index_value = min_factor[min_factor[column] != 1].index.tolist()
-
-            for element in min_index_value:
-                min_factor[column].loc[min_factor.index == element] = tmp[column].loc[tmp.index == element] / min_simulated
+        # Members clipped to the simulated range of the month
+        forecast_ens, factor = clip_ensemble(forecast_ens, min_simulated, max_simulated)
 
-            max_factor.loc[max_factor[column] <= max_simulated, column] = 1
-            max_index_value = max_factor[max_factor[column] != 1].index.tolist()
-
-            for element in max_index_value:
-                max_factor[column].loc[max_factor.index == element] = tmp[column].loc[tmp.index == element] / max_simulated
-
-            tmp.loc[tmp[column] <= min_simulated, column] = min_simulated
-            tmp.loc[tmp[column] >= max_simulated, column] = max_simulated
-            forecast_ens_df.update(pd.DataFrame(tmp[column].values, index=tmp.index, columns=[column]))
-            min_factor_df.update(pd.DataFrame(min_factor[column].values, index=min_factor.index, columns=[column]))
-            max_factor_df.update(pd.DataFrame(max_factor[column].values, index=max_factor.index, columns=[column]))
-
-        corrected_ensembles = geoglows.bias.correct_forecast(forecast_ens_df, simulated_df, observed_df)
-        corrected_ensembles = corrected_ensembles.multiply(min_factor_df, axis=0)
-        corrected_ensembles = corrected_ensembles.multiply(max_factor_df, axis=0)
+        corrected_ensembles = geoglows.bias.correct_forecast(forecast_ens, simulated_df, observed_df)
+        corrected_ensembles = pd.DataFrame(corrected_ensembles.to_numpy(dtype=factor.dtype) * factor,
+                                           index=forecast_ens.index, columns=forecast_ens.columns, copy=False)
 
         forecast_ens_bc_file_path = os.path.join(app.get_app_workspace().path, 'forecast_ens_bc.json')
-        corrected_ensembles.index.name = 'Datetime'
         corrected_ensembles.to_json(forecast_ens_bc_file_path)
 
-        ensemble = corrected_ensembles.copy()
-        high_res_df = ensemble['ensemble_52_m^3/s'].to_frame()
-        ensemble.drop(columns=['ensemble_52_m^3/s'], inplace=True)
-        ensemble.dropna(inplace=True)
-        high_res_df.dropna(inplace=True)
-
-        max_df = ensemble.quantile(1.0, axis=1).to_frame()
-        max_df.rename(columns={1.0: 'flow_max_m^3/s'}, inplace=True)
-
-        p75_df = ensemble.quantile(0.75, axis=1).to_frame()
-        p75_df.rename(columns={0.75: 'flow_75%_m^3/s'}, inplace=True)
-
-        p25_df = ensemble.quantile(0.25, axis=1).to_frame()
-        p25_df.rename(columns={0.25: 'flow_25%_m^3/s'}, inplace=True)
-
-        min_df = ensemble.quantile(0, axis=1).to_frame()
-        min_df.rename(columns={0.0: 'flow_min_m^3/s'}, inplace=True)
-
-        mean_df = ensemble.mean(axis=1).to_frame()
-        mean_df.rename(columns={0: 'flow_avg_m^3/s'}, inplace=True)
-
-        high_res_df.rename(columns={'ensemble_52_m^3/s': 'high_res_m^3/s'}, inplace=True)
-
-        fixed_stats = pd.concat([max_df, p75_df, mean_df, p25_df, min_df, high_res_df], axis=1)
+        fixed_stats = ensemble_stats(corrected_ensembles)
 
         forecast_data_bc_file_path = os.path.join(app.get_app_workspace().path, 'forecast_data_bc.json')
-        fixed_stats.index.name = 'Datetime'
         fixed_stats.to_json(forecast_data_bc_file_path)
 
         hydroviewer_figure = geoglows.plots.forecast_stats(stats=fixed_stats, titles={'Station': nomEstacion + '-' + str(codEstacion), 'Reach ID': comid, 'bias_corrected': True})
@@ -1386,6 +1424,7 @@ def get_time_series_bc(request):
         max_visible = max(fixed_stats.max())
 
         '''Correct Bias Forecasts Records'''
+        stage('bias_correct')
 
         date_ini = forecast_record.index[0]
         month_ini = date_ini.month
@@ -1457,10 +1496,15 @@ def get_time_series_bc(request):
             max_visible = max(record_plot.max().values[0], max_visible)
 
         '''Getting real time observed data'''
-        url_rt = 'http://fews.ideam.gov.co/colombia/jsonQ/00' + codEstacion + 'Qobs.json'
-        f = requests.get(url_rt, verify=False)
+        stage('fetch_observed_rt')
+        # Optional feed: a timeout or a failed request is the same as a non 200 answer
+        try:
+            f = batch.result(observed_rt_job)
+        except Exception as e:
+            print(str(e))
+            f = None
 
-        if f.status_code == 200:
+        if f is not None and f.status_code == 200:
             data = f.json()
 
             observedDischarge = (data.get('obs'))
@@ -1568,6 +1612,7 @@ def get_time_series_bc(request):
                 print(str(e))
 
         '''Getting Corrected Return Periods'''
+        stage('return_periods')
         max_annual_flow = corrected_df.groupby(corrected_df.index.strftime("%Y")).max()
         mean_value = np.mean(max_annual_flow.iloc[:,0].values)
         std_value = np.std(max_annual_flow.iloc[:,0].values)
@@ -1645,14 +1690,13 @@ def get_time_series_bc(request):
         hydroviewer_figure.add_trace(template(f'50 Year: {r50}', (r50, r50, r100, r100), colors['50 Year']))
         hydroviewer_figure.add_trace(template(f'100 Year: {r100}', (r100, r100, max(r100 + r100 * 0.05, max_visible), max(r100 + r100 * 0.05, max_visible)), colors['100 Year']))
 
+        stage('render')
         chart_obj = PlotlyView(hydroviewer_figure)
 
         context = {
             'gizmo_object': chart_obj,
         }
 
-        print("--- %s seconds forecasts_bc ---" % (time.time() - start_time))
-
         return render(request, 'historical_validation_tool_colombia/gizmo_ajax.html', context)
 
 
@@ -1663,6 +1707,8 @@ def get_time_series_bc(request):
         return JsonResponse({
             'error': f'{"error: " + str(e), "line: " + str(exc_tb.tb_lineno)}',
         })
+    finally:
+        batch.close()
 
 
 def get_available_dates(request):
@@ -1672,25 +1718,11 @@ def get_available_dates(request):
     subbasin = get_data['subbasin']
     comid = get_data['streamcomid']
 
-    res = requests.get('https://geoglows.ecmwf.int/api/AvailableDates/?region=' + watershed + '-' + subbasin, verify=False)
-
-    data = res.json()
-
-    dates_array = (data.get('available_dates'))
-
-    dates = []
+    dates = [[date_f, date, watershed, subbasin, comid] for date_f, date in AVAILABLE_DATES(watershed + '-' + subbasin)]
 
-    for date in dates_array:
-        if len(date) == 10:
-            date_mod = date + '000'
-            date_f = dt.datetime.strptime(date_mod, '%Y%m%d.%H%M').strftime('%Y-%m-%d %H:%M')
-        else:
-            date_f = dt.datetime.strptime(date, '%Y%m%d.%H%M').strftime('%Y-%m-%d')
-            date = date[:-3]
-        dates.append([date_f, date, watershed, subbasin, comid])
-
-    dates.append(['Select Date', dates[-1][1]])
-    dates.reverse()
+    if len(dates) > 0:
+        dates.append(['Select Date', dates[-1][1]])
+        dates.reverse()
 
     return JsonResponse({
         "success": "Data analysis complete!",
@@ -1698,6 +1730,7 @@ def get_available_dates(request):
     })
 
 
+@csv_export('observed')
 def get_observed_discharge_csv(request):
     """
     Get observed data from csv files in Hydroshare
@@ -1733,6 +1766,7 @@ def get_observed_discharge_csv(request):
         })
 
 
+@csv_export('simulated')
 def get_simulated_discharge_csv(request):
     """
     Get historic simulations from ERA Interim
@@ -1768,6 +1802,7 @@ def get_simulated_discharge_csv(request):
         })
 
 
+@csv_export('simulated_bc')
 def get_simulated_bc_discharge_csv(request):
     """
     Get historic simulations from ERA Interim
@@ -1804,6 +1839,7 @@ def get_simulated_bc_discharge_csv(request):
         })
 
 
+@csv_export('forecast')
 def get_forecast_data_csv(request):
     """""
     Returns Forecast data as csv
@@ -1839,6 +1875,7 @@ def get_forecast_data_csv(request):
         })
 
 
+@csv_export('forecast_ensemble')
 def get_forecast_ensemble_data_csv(request):
     """""
     Returns Forecast data as csv
@@ -1876,6 +1913,7 @@ def get_forecast_ensemble_data_csv(request):
         })
 
 
+@csv_export('forecast_bc')
 def get_forecast_bc_data_csv(request):
     """""
     Returns Forecast data as csv
@@ -1913,6 +1951,7 @@ def get_forecast_bc_data_csv(request):
         })
 
 
+@csv_export('forecast_ensemble_bc')
 def get_forecast_ensemble_bc_data_csv(request):
     """""
     Returns Forecast data as csv
@@ -1952,8 +1991,10 @@ def get_forecast_ensemble_bc_data_csv(request):
 
 
 ############################################################
+@timed
 def get_zoom_array(request):
     zoom_description = request.GET['zoom_desc']
+    write_files = request.GET.get('write_files', 'false').lower() == 'true'
 
     # Ivalid search
     if zoom_description == '':
@@ -1962,7 +2003,8 @@ def get_zoom_array(request):
         return JsonResponse(resp)
 
     try:
-        file_name, station_file, message, station_cont, boundary_cont = foo_station(search_id=zoom_description)
+        file_name, station_file, message, station_cont, boundary_cont = get_stations_catalog()(search_id=zoom_description,
+                                                                                              write_files=write_files)
 
         return JsonResponse({'geojson' : file_name,
                              'message' : message,
@@ -1980,6 +2022,193 @@ def get_zoom_array(request):
             'error': f'{"error: " + str(e), "line: " + str(exc_tb.tb_lineno)}',
         })
 
+def get_search_suggestions(request):
+    """
+    Station codes and names starting with the typed text (autocomplete)
+    """
+    try:
+        query = request.GET.get('query', '')
+        top_k = int(request.GET.get('top_k', 10))
+
+        return JsonResponse({'suggestions' : get_stations_catalog().suggest(query, top_k=top_k)})
+
+    except Exception as e:
+
+        exc_type, exc_obj, exc_tb = sys.exc_info()
+        print("error: " + str(e))
+        print("line: " + str(exc_tb.tb_lineno))
+
+        return JsonResponse({
+            'error': f'{"error: " + str(e), "line: " + str(exc_tb.tb_lineno)}',
+        })
+
+def get_station_suggest(request):
+    """
+    Ranked fuzzy matches (station and stream names) of the typed text
+    """
+    try:
+        query = request.GET.get('query', '')
+        top_k = int(request.GET.get('top_k', 10))
+
+        matches = get_stations_catalog().fuzzy_search(query, top_k=top_k)
+
+        return JsonResponse({'suggestions' : [name for name, _ in matches],
+                             'scores'      : [score for _, score in matches]})
+
+    except Exception as e:
+
+        exc_type, exc_obj, exc_tb = sys.exc_info()
+        print("error: " + str(e))
+        print("line: " + str(exc_tb.tb_lineno))
+
+        return JsonResponse({
+            'error': f'{"error: " + str(e), "line: " + str(exc_tb.tb_lineno)}',
+        })
+
+@timed
+def get_spatial_search(request):
+    """
+    Nearest stations to lat, lon (k) or stations inside the bbox
+    (min_lat,min_lon,max_lat,max_lon). Same response of get_zoom_array.
+    """
+    try:
+        get_data = request.GET
+
+        if get_data.get('bbox', '') != '':
+            bbox = [float(ii) for ii in get_data['bbox'].split(',')]
+            rv = get_stations_catalog().spatial_search(bbox=bbox)
+        else:
+            rv = get_stations_catalog().spatial_search(lat=float(get_data['lat']),
+                                                       lon=float(get_data['lon']),
+                                                       k=int(get_data.get('k', 1)))
+
+        file_name, station_file, message, station_cont, boundary_cont = rv
+
+        return JsonResponse({'geojson' : file_name,
+                             'message' : message,
+                             'stations': station_file,
+                             'stations-cont' : station_cont,
+                             'boundary-cont' : boundary_cont})
+
+    except Exception as e:
+
+        exc_type, exc_obj, exc_tb = sys.exc_info()
+        print("error: " + str(e))
+        print("line: " + str(exc_tb.tb_lineno))
+
+        return JsonResponse({
+            'error': f'{"error: " + str(e), "line: " + str(exc_tb.tb_lineno)}',
+        })
+
+def get_boundary(request):
+    """
+    Department, basin or subbasin boundary simplified for the map zoom.
+    level: 0 (original) to 3 (coarsest), 'auto' picks it from the extent.
+    """
+    try:
+        get_data = request.GET
+        boundary = dict(public_dir=os.path.join(os.path.dirname(__file__), 'public'),
+                        layer=get_data['layer'],
+                        file_name=get_data['name'],
+                        level=get_data.get('level', 'auto'))
+
+        # Original or prebuilt file -> precompressed siblings when available
+        path = get_boundary_file(**boundary)
+        if path is not None:
+            return precompressed_file_response(request, path)
+
+        content = get_boundary_geojson(**boundary)
+
+        if content is None:
+            return JsonResponse({'error': 'Boundary not found'}, status=404)
+
+        return HttpResponse(content, content_type='application/json')
+
+    except Exception as e:
+
+        exc_type, exc_obj, exc_tb = sys.exc_info()
+        print("error: " + str(e))
+        print("line: " + str(exc_tb.tb_lineno))
+
+        return JsonResponse({
+            'error': f'{"error: " + str(e), "line: " + str(exc_tb.tb_lineno)}',
+        })
+
+def get_skill(request):
+    """
+    Station skill layer from the regional validation results of the app
+    workspace. metrics: 'kge_2012,nse' (original and corrected) or columns
+    ('kge_2012_bc'), min_<column> / max_<column>: thresholds,
+    bbox: min_lat,min_lon,max_lat,max_lon, format: 'array' or 'geojson'.
+    """
+    try:
+        get_data = request.GET
+
+        workspace_dir = app.get_app_workspace().path
+        results_files = [os.path.join(workspace_dir, file_name) for file_name in SKILL_RESULTS_FILES
+                         if os.path.isfile(os.path.join(workspace_dir, file_name))]
+        if len(results_files) == 0:
+            return JsonResponse({'error': 'No regional validation results'}, status=404)
+
+        thresholds = {}
+        for param, value in get_data.items():
+            if param.startswith(('min_', 'max_')) and value != '':
+                limits = thresholds.setdefault(param[4:], [None, None])
+                limits[0 if param.startswith('min_') else 1] = float(value)
+
+        metrics = get_data.get('metrics', '')
+        bbox = get_data.get('bbox', '')
+
+        content = get_skill_layer(results_files[0])(
+            metrics=None if metrics == '' else metrics.split(','),
+            thresholds={column: tuple(limits) for column, limits in thresholds.items()},
+            bbox=None if bbox == '' else [float(ii) for ii in bbox.split(',')],
+            fmt=get_data.get('format', 'array'))
+
+        return HttpResponse(content, content_type='application/json')
+
+    except Exception as e:
+
+        exc_type, exc_obj, exc_tb = sys.exc_info()
+        print("error: " + str(e))
+        print("line: " + str(exc_tb.tb_lineno))
+
+        return JsonResponse({
+            'error': f'{"error: " + str(e), "line: " + str(exc_tb.tb_lineno)}',
+        })
+
+@metrics_access
+def get_metrics(request):
+    """
+    Process metrics (cache, upstream and compute) in Prometheus text format
+    """
+    # Files of the workspace now (written and removed by other requests)
+    workspace_dir = app.get_app_workspace().path
+    sizes = {}
+    try:
+        file_names = sorted(os.listdir(workspace_dir))
+    except FileNotFoundError:
+        file_names = []
+    for file_name in file_names:
+        if file_name.endswith('.json'):
+            try:
+                sizes[file_name] = os.path.getsize(os.path.join(workspace_dir, file_name))
+            except FileNotFoundError:
+                continue
+
+    WORKSPACE_FILE_BYTES.clear()
+    for file_name, size in sizes.items():
+        WORKSPACE_FILE_BYTES.set(size, file=file_name)
+
+    return HttpResponse(METRICS.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@metrics_access
+def get_timing_stats(request):
+    """
+    p50/p95 (ms) of the spans of the last requests of every timed controller
+    """
+    return JsonResponse(TIMING_STATS.summary(endpoint=request.GET.get('endpoint')))
+
 ############################################################
 
 def user_manual(request):
@@ -1,10 +1,34 @@
 import os
 import uuid
 import json
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 
 from .auxFun import *
+from .availableDates import Available_dates, AVAILABLE_DATES, parse_available_dates
+from .batchValidation import (metric_column, read_results_table, run_regional_validation, validate_station,
+                              write_results_table, VALIDATION_KINDS, VALIDATION_METRICS)
+from .confusionMatrix import *
+from .fileCache import File_cache, FILE_CACHE
+from .figures import hydrograph_figure, scatter_traces
+from .forecastEnsemble import (clip_ensemble, ensemble_stats, naive_index, read_api_csv, read_forecast_ensemble,
+                               ENSEMBLE_DTYPE, ENSEMBLE_STATS_COLUMNS, HIGH_RES_COLUMN)
+from .geojsonSimplify import (build_boundary_extents, build_simplified_geojsons, get_boundary_extents,
+                              get_boundary_file, get_boundary_geojson, BOUNDARY_CACHE, BOUNDARY_CACHE_SIZE,
+                              SIMPLIFY_LEVELS)
+from .metrics import (Counter, Gauge, Histogram, Metrics_registry, METRICS, CACHE_REQUESTS, CSV_EXPORTS,
+                      CSV_EXPORT_BYTES, REQUEST_SECONDS, UPSTREAM_REQUESTS, UPSTREAM_SECONDS,
+                      WORKSPACE_FILE_BYTES, upstream)
+from .ngramIndex import Ngram_index, fold_accents
+from .scatterDensity import (get_scatter_data, Scatter_data, SCATTER_BINS, SCATTER_FILES,
+                             SCATTER_MARKERS_LIMIT)
+from .skillLayer import get_skill_layer, Skill_layer, SKILL_METRICS
+from .spatialIndex import Spatial_index
+from .timing import current_timer, span, stage, timed, Request_timer, Timing_stats, TIMING_STATS
+from .upstreamTransport import Upstream_batch, Upstream_transport, UPSTREAM, UPSTREAM_BATCH_WORKERS, UPSTREAM_MODES
 
 ######################################################################
 class Stations_manage:
@@ -28,133 +52,231 @@ class Stations_manage:
         self.data.rename(columns={'index': 'ID_tmp'}, inplace=True)
 
         self.search_list = self.__extract_search_list__()
+        self.search_index = self.__buildindex__()
+        self.names_index = Ngram_index(keys=self.search_index['str'].keys())
+        self.spatial_index = Spatial_index(lat=self.data[self.gnrl_dict['coord columns'][0]].values,
+                                           lon=self.data[self.gnrl_dict['coord columns'][1]].values)
+
+        # Memo of zoom responses
+        self.responses_size = 512
+        self.__responses = OrderedDict()
+        self.__lock = threading.Lock()
 
         print('Stations list loaded.')
 
     
-    def __call__(self, search_id):
+    def __call__(self, search_id, write_files=False):
         '''
         Input: 
-            search_data : str = value to search
+            search_data : str  = value to search
+            write_files : bool = also write station_geojson.json and
+                                 boundary_geojson.json to the workspace
         '''
+        key = self.__querykey__(search_id)
+
+        # Responses are memoized by normalized query (without files)
+        if not write_files:
+            with self.__lock:
+                if key in self.__responses:
+                    self.__responses.move_to_end(key)
+                    CACHE_REQUESTS.inc(cache='station_search', result='hit')
+                    return self.__responses[key]
+            CACHE_REQUESTS.inc(cache='station_search', result='miss')
 
         # Extract coords of the station
-        coords = self.__coordssearch___(search_id)
+        with span('station_search'):
+            coords = self.__coordssearch___(key)
+            rv = self.__zoomresponse__(coords, write_files=write_files)
+
+        if not write_files:
+            with self.__lock:
+                self.__responses[key] = rv
+                while len(self.__responses) > self.responses_size:
+                    self.__responses.popitem(last=False)
+
+        return rv
+
+
+    def spatial_search(self, lat=None, lon=None, k=1, bbox=None, write_files=False):
+        '''
+        Input:
+            lat, lon    : float = point for the k nearest stations
+            k           : int   = number of nearest stations
+            bbox        : list  = [min_lat, min_lon, max_lat, max_lon] stations
+                                  inside the bounding box (used if given)
+            write_files : bool  = same of __call__
+        Output:
+            Same output of __call__
+        '''
+        if bbox is not None:
+            rows = self.spatial_index.bbox(*bbox)
+        else:
+            rows = self.spatial_index.nearest(lat=lat, lon=lon, k=k)
+
+        return self.__zoomresponse__(self.data.iloc[rows].copy(), write_files=write_files)
+
+
+    def __zoomresponse__(self, coords, write_files=False):
 
         # Assert does not existence of the station
         if len(coords) < 1:
-            return 'COLOMBIA.json', coords, 404, '', ''
+            return 'COLOMBIA.json', '', 404, '', ''
 
         # Extract coords of the polygon
         lat_coord, lon_coord = get_zoom_coords(df=coords)
 
-        # Build station output file
-        output_station_file, station_file_cont = self.__printstaiongeojson__(df=coords)
+        # Build station and boundary geojson
+        station_file_cont = self.__stationgeojson__(df=coords)
+        boundary_file_cont = self.__boundarygeojson__(lat_coord=lat_coord, lon_coord=lon_coord)
 
-        # Build coundary output file
-        output_file, boundary_file_cont = self.__printgeojson__(lat_coord=lat_coord, lon_coord=lon_coord)
+        # Print files only on demand
+        output_station_file = ''
+        output_file = ''
+        if write_files:
+            output_station_file = self.__printjson__(file_name='station_geojson.json', json_file=station_file_cont)
+            output_file = self.__printjson__(file_name='boundary_geojson.json', json_file=boundary_file_cont)
 
         return output_file, output_station_file, 200, station_file_cont, boundary_file_cont
 
 
-    def __printstaiongeojson__(self, df):
+    def __stationgeojson__(self, df):
 
-        lon = self.gnrl_dict['coord columns'][1]
-        lat = self.gnrl_dict['coord columns'][0]
+        lon = df[self.gnrl_dict['coord columns'][1]].tolist()
+        lat = df[self.gnrl_dict['coord columns'][0]].tolist()
 
-        # TODO: Add variable name file for multyple user. And remove path
-        # pathdir and name file
-        # file_name = str(uuid.uuid4()) + '.json'
-        file_name = 'station_geojson' + '.json'
-        file_path = os.sep.join([self.path, file_name])
+        # Build json
+        feature = [{'type' : "Feature",
+                    "geometry" : {"type" : "Point",
+                                  "coordinates" : [lon_st, lat_st]}} for lon_st, lat_st in zip(lon, lat)]
 
+        return {"type" : "FeatureCollection",
+                "features" : feature}
 
-        # Build json
-        feature = []
-        for _, row in df.iterrows():
-            feature.append({'type' : "Feature",
-                            "geometry" : {"type" : "Point",
-                                          "coordinates":[row[lon], row[lat]]}})
-        json_file = {"type" : "FeatureCollection",
-                     "features" : feature}
 
+    @staticmethod
+    def __boundarygeojson__(lat_coord, lon_coord):
+
+        lat_coord = [float(ii) for ii in lat_coord]
+        lon_coord = [float(ii) for ii in lon_coord]
 
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(json_file, f, ensure_ascii=False, indent=4)
+        return {"type":"FeatureCollection",
+                "features": [{ "type" : "Feature",
+                               "geometry" : { "type"       : "Polygon",
+                                              "coordinates" : [[[lon_coord[0], lat_coord[0]],
+                                                                [lon_coord[1], lat_coord[1]],
+                                                                [lon_coord[3], lat_coord[3]],
+                                                                [lon_coord[2], lat_coord[2]]]]
+                                            }
+                            }]
+                }
 
-        return file_name, json_file
 
-    def __printgeojson__(self, lat_coord, lon_coord):
-        
+    def __printjson__(self, file_name, json_file):
+
         # TODO: Add variable name file for multyple user. And remove path
         # pathdir and name file
         # file_name = str(uuid.uuid4()) + '.json'
-        file_name = 'boundary_geojson' + '.json'
         file_path = os.sep.join([self.path, file_name])
 
-        # Print json
-        json_file = {"type":"FeatureCollection", 
-                    "features": [{ "type" : "Feature",
-                                   "geometry" : { "type"       : "Polygon",
-                                                  "coordinates" : [[[lon_coord[0], lat_coord[0]],
-                                                                    [lon_coord[1], lat_coord[1]],
-                                                                    [lon_coord[3], lat_coord[3]],
-                                                                    [lon_coord[2], lat_coord[2]]]]
-                                                }
-                                }]
-                    }
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(json_file, f, ensure_ascii=False)
 
+        return file_name
 
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(json_file, f, ensure_ascii=False, indent=4)
-        
-        return file_name, json_file
+
+    def suggest(self, prefix, top_k=10):
+        '''
+        Input:
+            prefix : str = text typed by the user
+            top_k  : int = max number of suggestions
+        Output:
+            rv     : list = codes and names starting with prefix
+        '''
+        prefix = normalize_name(prefix)
+        if prefix == '':
+            return []
+
+        # search_list is sorted -> prefix matches are contiguous
+        rv = []
+        for key in self.search_list[bisect_left(self.search_list, prefix):]:
+            if not key.startswith(prefix) or len(rv) >= top_k:
+                break
+            rv.append(key)
+        return rv
 
 
-    def __coordssearch___(self, search_id):
+    def fuzzy_search(self, query, top_k=10):
+        '''
+        Input:
+            query : str = station or stream name (partial or misspelled)
+            top_k : int = max number of matches
+        Output:
+            rv    : list = [(name, score), ...] best matches first
+        '''
+        return self.names_index(query, top_k=top_k)
 
+
+    @staticmethod
+    def __querykey__(search_id):
+        '''
+        Normalized query -> (case, value), case in 'int', 'lat lon', 'str'
+        '''
         # Identify type of input
         try:
             # Search by code
-            seach_case = 'int'
-            search_id = str(int(search_id))
-            columns_to_search = self.gnrl_dict['columns int search']
-        except:
-            # Search by name
-            search_case = 'name'
-            search_id = str(search_id).upper()
-            columns_to_search = self.gnrl_dict['columns str search']
+            return 'int', str(int(search_id))
+        except (TypeError, ValueError):
+            pass
 
-        
-        # Extract column to search
-        search_df = pd.DataFrame()
-        for col in columns_to_search:
-            tmp_df = pd.DataFrame()
-            tmp_df['ID_tmp'] = self.data['ID_tmp']
+        # Search by lat,lon
+        lat_lon = parse_lat_lon(search_id)
+        if lat_lon is not None:
+            return 'lat lon', lat_lon
+
+        # Search by name
+        return 'str', normalize_name(search_id)
 
-           
-            if seach_case == 'int':
-                tmp_df['values'] = self.data[col].astype(str)
-            elif seach_case == 'str':
-                # TODO: Add decodifficator for spañish when by name is used
-                tmp_df['values'] = self.data[col].astype(str)
-            else:
-                # TODO: Add search by lat,lon
-                pass
 
-            search_df = pd.concat([search_df, tmp_df], ignore_index=True)
+    def __coordssearch___(self, key):
 
-        idtmp_to_search = search_df.loc[search_df['values'] == search_id]
+        case, search_id = key
+
+        if case == 'lat lon':
+            # Nearest station
+            rows = self.spatial_index.nearest(lat=search_id[0], lon=search_id[1])
+        else:
+            rows = self.search_index[case].get(search_id, [])
+
+        # Names without an exact match -> best fuzzy match
+        if len(rows) < 1 and case == 'str':
+            matches = self.fuzzy_search(search_id, top_k=1)
+            if len(matches) > 0:
+                rows = self.search_index[case][matches[0][0]]
+
+        return self.data.iloc[rows].copy()
+
+
+    def __buildindex__(self):
+        '''
+        Hash indexes value -> rows for the code and for the name columns
+        '''
+        rv = {}
+        for case in ['int', 'str']:
+            columns = self.gnrl_dict['columns {} search'.format(case)]
+            keys = self.data[columns].astype(str).values.ravel('F')
+            rows = np.tile(np.arange(len(self.data)), len(columns))
 
-        valids = self.data[columns_to_search].isin(idtmp_to_search['values'].values).values
-        rv = self.data.loc[valids].copy()
+            index = {}
+            for key, row in zip(keys, rows):
+                index.setdefault(key, set()).add(row)
+            rv[case] = {key : sorted(val) for key, val in index.items()}
 
         return rv
 
 
     def __extract_search_list__(self):
         rv = self.full_data[self.gnrl_dict['columns int search'] + self.gnrl_dict['columns str search']].copy()
-        rv = np.unique(rv.values.ravel('F'))
+        rv = np.unique(rv.astype(str).values.ravel('F'))
         return rv.tolist()
 
 
@@ -163,50 +285,72 @@ class Stations_manage:
         '''
         Read file for json (geojson) named -> IDEAM_Stations_v2.json
         '''
-        data = json.load(open(path_dir))['features']
-        df = pd.DataFrame()
+        with open(path_dir) as f:
+            data = json.load(f)['features']
 
-        for line in data:
-            line_data = line['properties']
-            col_names = list(line_data.keys())
-            col_data =[line_data[ii] for ii in col_names]
-            tmp = pd.DataFrame(data = [col_data],
-                               columns=col_names)
-            df = pd.concat([df, tmp], ignore_index=True)
+        return pd.DataFrame([line['properties'] for line in data])
 
-        for column in df.columns:
-            df[column] = df[column].astype(str)
-
-        return df
-        
 
     def __fix_columns__(self):
         '''
         Fix the values of the columns depending of: integer value or string value
         '''
-		# Change for str columns
-        # for col_name in self.main_cols['str column name']:
+        # Change for str columns
         for col_name in self.gnrl_dict['columns str search']:
+            self.full_data[col_name] = normalize_names(self.full_data[col_name])
 
-            # Replace null values
-            self.full_data[col_name].fillna(value='na', inplace = True)
-
-            # Replace other letters (ES)
-            self.full_data[col_name] = self.full_data[col_name].str.lower()
-            self.full_data[col_name] = list(map(lambda x: x.replace('á', 'a'), self.full_data[col_name]))
-            self.full_data[col_name] = list(map(lambda x: x.replace('é', 'e'), self.full_data[col_name]))
-            self.full_data[col_name] = list(map(lambda x: x.replace('í', 'i'), self.full_data[col_name]))
-            self.full_data[col_name] = list(map(lambda x: x.replace('ó', 'o'), self.full_data[col_name]))
-            self.full_data[col_name] = list(map(lambda x: x.replace('ú', 'u'), self.full_data[col_name]))
-            # self.geoJSON[col_name] = list(map(lambda x: x.replace('ñ', 'n'), self.geoJSON[col_name]))
-            self.full_data[col_name] = list(map(lambda x: x.replace('_', ' '), self.full_data[col_name]))
-            self.full_data[col_name] = self.full_data[col_name].str.upper()
-            self.full_data[col_name] = self.full_data[col_name].str.lstrip()
-            self.full_data[col_name] = self.full_data[col_name].str.rstrip()
-
-		# Change for int columns
-        # for col_name in self.main_cols['int column name']:
+        # Change for int columns
         for col_name in self.gnrl_dict['columns int search']:
-            self.full_data[col_name] = list(map(lambda x : str(int(float(x))), self.full_data[col_name]))
+            self.full_data[col_name] = pd.to_numeric(self.full_data[col_name]).astype('int64')
+
+        # Change for coord columns
+        for col_name in self.gnrl_dict['coord columns']:
+            self.full_data[col_name] = pd.to_numeric(self.full_data[col_name]).astype(float)
+
+
+# Replace other letters (ES)
+NAMES_TRANSLATE = str.maketrans({'á' : 'a', 'é' : 'e', 'í' : 'i', 'ó' : 'o', 'ú' : 'u', '_' : ' '})
+
+
+def parse_lat_lon(text):
+    '''
+    'lat,lon' -> (lat, lon), None if text is not a valid coordinate
+    '''
+    try:
+        lat, lon = [float(ii) for ii in str(text).split(',')]
+    except ValueError:
+        return None
+
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return lat, lon
+    return None
+
+
+def normalize_name(name):
+    '''
+    Scalar version of normalize_names
+    '''
+    return str(name).lower().translate(NAMES_TRANSLATE).upper().strip()
+
+
+def normalize_names(names):
+    '''
+    Upper case names without accents (ñ is kept), '_' and edge blanks.
+    Missing names are 'NAN', as the str cast of the original table gave.
+    Input:
+        names : pd.Series = names to normalize
+    '''
+    names = names.fillna('nan').astype(str)
+    return names.str.lower().str.translate(NAMES_TRANSLATE).str.upper().str.strip()
+
+
+######################################################################
 
-######################################################################
\ No newline at end of file
+def get_stations(path_dir):
+    '''
+    Stations management object shared by the process. It is loaded on the
+    first use and reloaded only when the stations file changes.
+    '''
+    return FILE_CACHE(key=('stations', path_dir),
+                      paths=[path_dir],
+                      builder=lambda: Stations_manage(path_dir=path_dir))
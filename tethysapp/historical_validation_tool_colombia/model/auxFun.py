@@ -1,32 +1,41 @@
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+
 import numpy as np
-from scipy import stats
-from sklearn.metrics import confusion_matrix, mean_squared_error
-from sklearn.utils.multiclass import unique_labels
+
+from .confusionMatrix import RP_CLASS_LABELS, confusion_matrices, confusion_accuracy, format_percent
+from .timing import span
+
+
+# Distributions evaluated for the return periods -> (scipy.stats dist, shape params)
+RP_DISTRIBUTIONS = {'normal'    : ('norm', ()),
+                    'lognormal' : ('pearson3', (1, )),
+                    'weibull'   : ('dweibull', (1, )),
+                    'chi2'      : ('chi2', (2, )),
+                    'gumbel'    : ('gumbel_r', ())}
 
 
 # Main objects
 ##############################################################################
+Return_period_fit = namedtuple('Return_period_fit', ['best_distri', 'distri', 'metrics',
+                                                     'data', 'bind', 'loc', 'scale'])
+
+
 class Calc_return_period:
-    def __init__(self):
-        self.rp_dict = {'obs'       : {},
-                        'normal'    : {'fun' : stats.norm,
-                                       'para' : {'loc'  : None,
-                                                 'scale': None}},
-                        'lognormal' : {'fun' : stats.pearson3,
-                                       'para' : {'loc'  : None,
-                                                 'scale': None,
-                                                 'skew' : 1}},
-                        'weibull'   : {'fun' : stats.dweibull,
-                                       'para' : {'loc'  : None,
-                                                 'scale': None,
-                                                 'c'    : 1}},
-                        'chi2'      : {'fun' : stats.chi2,
-                                       'para' : {'loc'  : None,
-                                                 'scale': None,
-                                                 'df'   : 2}},
-                        'gumbel'    : {'fun' : stats.gumbel_r,
-                                       'para' : {'loc'  : None,
-                                                 'scale': None}}}
+    def __init__(self, cache_size=128):
+        '''
+        Return period object. Fitted results are immutable and, when
+        cache_size > 0, memoized by the hash of the input series, so one
+        instance can be shared between threads.
+        '''
+        self.cache_size = cache_size
+        self.__cache = OrderedDict()
+        self.__lock = threading.Lock()
+
+        # Last fit of every thread (get_summarice_proccess without data)
+        self.__last = threading.local()
 
 
     def __call__(self, kwargs):
@@ -41,64 +50,116 @@ class Calc_return_period:
         t    = kwargs.get('t', None)
         data = kwargs.get('data', None)
 
-        # Main values
-        data = np.array(data).astype(float)#.flatten()
         p = 1 - (np.array(t).astype(float) ** -1)
-        mean = np.nanmean(data)
-        std = np.nanstd(data)
-        
-        # obs calc
-        data_hist, bind_edges = np.histogram(a=data, bins='sturges', density=True)
-        self.rp_dict['obs'].update({'data' : data_hist})
-        bind_edges_mean = (bind_edges[:-1] + bind_edges[1:]) / 2.0
-        self.rp_dict['obs'].update({'bind' : bind_edges_mean})
+        fit = self.fit(data)
+        self.__last.fit = fit
+        return fit.distri.ppf(p)
 
-        # PDF calc
-        for distri in self.rp_dict.keys():
-            if 'obs' == distri:
-                continue
 
-            # Extract pdf
-            self.rp_dict[distri].update({'pdf' : self.__extracpdf__(distri=distri, bind=bind_edges_mean, mean=mean, std=std)})
-            self.rp_dict[distri].update({'metrics': self.__calcmetricts__(distri=distri)})
+    def fit(self, data):
+        '''
+        Input:
+            data : list = time series
+        Output:
+            fit  : Return_period_fit = Best distribution (frozen) and summary
+        '''
+        data = np.array(data).astype(float)#.flatten()
+        if not self.cache_size:
+            return self.__fitseries__(data)
 
-        return self.__ppfbestmetric__(p=p)
+        key = hashlib.sha1(data.tobytes()).hexdigest()
+        with self.__lock:
+            if key in self.__cache:
+                self.__cache.move_to_end(key)
+                return self.__cache[key]
 
+        rv = self.__fitseries__(data)
 
-    # Get method
-    def get_summarice_proccess(self):
-        return self.rp_dict
+        with self.__lock:
+            self.__cache[key] = rv
+            while len(self.__cache) > self.cache_size:
+                self.__cache.popitem(last=False)
+        return rv
 
 
-    # Hiden methods
-    def __ppfbestmetric__(self, p):
+    # Get method
+    def get_summarice_proccess(self, data=None):
         '''
+        Summary of a fit with the layout of the original rp_dict:
+            {'obs'  : {'data', 'bind', 'best_distri'},
+             distri : {'fun', 'para', 'pdf', 'metrics'}, ...}
         Input:
-            p   : list = Exceedance probability
-        Output:
-            ppf : list = Best approximation results
+            data : list = time series (None -> series of the last call of
+                          this thread)
         '''
-        best_distri = [[distri, self.rp_dict[distri]['metrics']] for distri in self.rp_dict.keys() if distri != 'obs']
-        best_distri = np.reshape(best_distri, (len(best_distri), 2)).T
-        best_distri = best_distri[:, best_distri[1].astype(float) == min(best_distri[1].astype(float))][0][0]
-        self.rp_dict['obs'].update({'best_distri' : best_distri})
+        if data is not None:
+            fit = self.fit(data)
+        else:
+            fit = getattr(self.__last, 'fit', None)
+            if fit is None:
+                raise ValueError('get_summarice_proccess without data needs a previous call')
+
+        rv = {'obs' : {'data' : fit.data, 'bind' : fit.bind, 'best_distri' : fit.best_distri}}
+        for distri, fun, shape in _rpdistributions():
+            para = {'loc' : fit.loc, 'scale' : fit.scale}
+            if shape:
+                # Shape parameters by name (skew, c, df)
+                para.update(zip(fun.shapes.replace(' ', '').split(','), shape))
+            rv[distri] = {'fun'     : fun,
+                          'para'    : para,
+                          'pdf'     : fun.pdf(fit.bind, **para),
+                          'metrics' : fit.metrics[distri]}
+        return rv
 
-        return self.rp_dict[best_distri]['fun'].ppf(q=p, **self.rp_dict[best_distri]['para'])
 
+    # Hiden methods
+    @staticmethod
+    def __fitseries__(data):
+        '''
+        Evaluate every distribution of RP_DISTRIBUTIONS against the density
+        histogram of data and keep the one with the lowest MSE.
+        '''
+        mean = np.nanmean(data)
+        std = np.nanstd(data)
 
-    def __calcmetricts__(self, distri):
-        sim = self.rp_dict[distri]['pdf']
-        obs = self.rp_dict['obs']['data']
-        return mean_squared_error(y_true=obs,y_pred=sim)
-
+        # obs calc
+        data_hist, bind_edges = np.histogram(a=data, bins='sturges', density=True)
+        bind_edges_mean = (bind_edges[:-1] + bind_edges[1:]) / 2.0
 
-    def __extracpdf__(self, distri, bind, mean, std):
-        self.rp_dict[distri]['para']['loc'] = mean
-        self.rp_dict[distri]['para']['scale'] = std
-        return self.rp_dict[distri]['fun'].pdf(x=bind, **self.rp_dict[distri]['para'])
+        # PDF calc
+        metrics = {}
+        frozen = {}
+        for distri, fun, shape in _rpdistributions():
+            frozen[distri] = fun(*shape, loc=mean, scale=std)
+            metrics[distri] = float(np.mean((data_hist - frozen[distri].pdf(bind_edges_mean)) ** 2))
+
+        best_distri = min(metrics, key=metrics.get)
+
+        data_hist.flags.writeable = False
+        bind_edges_mean.flags.writeable = False
+
+        return Return_period_fit(best_distri=best_distri,
+                                 distri=frozen[best_distri],
+                                 metrics=MappingProxyType(metrics),
+                                 data=data_hist,
+                                 bind=bind_edges_mean,
+                                 loc=mean,
+                                 scale=std)
+
+# Shared (thread-safe) return period object used by calc_return_period
+RETURN_PERIOD = Calc_return_period()
 ##############################################################################
 
 # Main functions
+def _rpdistributions():
+    '''
+    [(name, scipy dist, shape params), ...] of RP_DISTRIBUTIONS. scipy.stats
+    is imported on the first fit, not with the model.
+    '''
+    from scipy import stats
+    return [(name, getattr(stats, dist), shape) for name, (dist, shape) in RP_DISTRIBUTIONS.items()]
+
+
 def calc_return_period(**kwargs):
     """
     Input:
@@ -107,17 +168,107 @@ def calc_return_period(**kwargs):
     Output:
         st   : float = Best streamflow approximation for t return periode
     """
-    foo = Calc_return_period()
-    return foo(kwargs)
+    return RETURN_PERIOD(kwargs)
+
+
+@span('return_period')
+def calc_return_period_batch(t, data, n_jobs=None, chunk_size=256):
+    """
+    Batched version of calc_return_period for many stations at once.
+    Input:
+        t          : list = Return periode
+        data       : 2-D array = annual maximum series (stations x years),
+                                 padded with NaN
+        n_jobs     : int  = Number of worker processes (None -> no pool)
+        chunk_size : int  = Stations evaluated by each task of the pool
+    Output:
+        rv         : dict = 'best_distri' : name of the best distribution
+                            'para'        : {'loc' : array, 'scale' : array}
+                            'metrics'     : MSE (stations x distributions)
+                            'distri'      : distribution names (metrics order)
+                            'st'          : flows (stations x t)
+    """
+    data = np.atleast_2d(np.array(data, dtype=float))
+    p = 1 - (np.atleast_1d(np.array(t, dtype=float)) ** -1)
+
+    if n_jobs is None or n_jobs < 2 or len(data) <= chunk_size:
+        return _fit_batch(data=data, p=p)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunks = [data[ii:ii + chunk_size] for ii in range(0, len(data), chunk_size)]
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        results = list(executor.map(_fit_batch, chunks, [p] * len(chunks)))
+
+    return {'best_distri' : np.concatenate([rr['best_distri'] for rr in results]),
+            'para'        : {'loc'   : np.concatenate([rr['para']['loc'] for rr in results]),
+                             'scale' : np.concatenate([rr['para']['scale'] for rr in results])},
+            'metrics'     : np.concatenate([rr['metrics'] for rr in results]),
+            'distri'      : results[0]['distri'],
+            'st'          : np.concatenate([rr['st'] for rr in results])}
+
+
+def _fit_batch(data, p):
+    '''
+    Fit and score every distribution of RP_DISTRIBUTIONS against the
+    'sturges' density histogram of each row of data.
+    '''
+    valid = ~np.isnan(data)
+    n = valid.sum(axis=1)
+    mean = np.nanmean(data, axis=1)
+    std = np.nanstd(data, axis=1)
+
+    # Histogram edges per row (same rule as np.histogram(bins='sturges'))
+    min_val = np.nanmin(data, axis=1)
+    max_val = np.nanmax(data, axis=1)
+    flat = min_val == max_val
+    min_val = np.where(flat, min_val - 0.5, min_val)
+    max_val = np.where(flat, max_val + 0.5, max_val)
+
+    n_bins = np.ceil(np.log2(np.maximum(n, 1)) + 1).astype(int)
+    max_bins = n_bins.max()
+    width = (max_val - min_val) / n_bins
+
+    # Counts by bincount over (row, bin) combined indices
+    rows = np.broadcast_to(np.arange(len(data))[:, None], data.shape)[valid]
+    bins = np.floor((data[valid] - min_val[rows]) / width[rows]).astype(int)
+    bins = np.minimum(bins, n_bins[rows] - 1)
+    counts = np.bincount(rows * max_bins + bins, minlength=len(data) * max_bins)
+    counts = counts.reshape(len(data), max_bins)
+
+    bin_mask = np.arange(max_bins)[None, :] < n_bins[:, None]
+    data_hist = counts / (n[:, None] * width[:, None])
+    bind = min_val[:, None] + (np.arange(max_bins)[None, :] + 0.5) * width[:, None]
+
+    # Score every distribution with the mean squared error over valid bins
+    metrics = np.empty((len(data), len(RP_DISTRIBUTIONS)))
+    distributions = _rpdistributions()
+    for ii, (_, fun, shape) in enumerate(distributions):
+        pdf = fun.pdf(bind, *shape, loc=mean[:, None], scale=std[:, None])
+        metrics[:, ii] = np.sum(np.where(bin_mask, (data_hist - pdf) ** 2, 0), axis=1) / n_bins
+
+    distri = list(RP_DISTRIBUTIONS.keys())
+    best = np.argmin(np.where(np.isnan(metrics), np.inf, metrics), axis=1)
+
+    st = np.empty((len(data), len(p)))
+    for ii, (_, fun, shape) in enumerate(distributions):
+        rows = best == ii
+        if rows.any():
+            st[rows] = fun.ppf(p[None, :], *shape, loc=mean[rows, None], scale=std[rows, None])
+
+    return {'best_distri' : np.array(distri)[best],
+            'para'        : {'loc' : mean, 'scale' : std},
+            'metrics'     : metrics,
+            'distri'      : distri,
+            'st'          : st}
 ##############################################################################
 
+@span('confusion_matrix')
 def get_confusion_matrix_data(obs, sim):
 
     # labels = unique_labels(obs, sim)
-    labels = [0, 1, 2, 3, 4, 5, 6]
-    rv = confusion_matrix(y_true=obs,
-                          y_pred=sim,
-                          labels=labels)
+    labels = RP_CLASS_LABELS
+    rv = confusion_matrices(obs=obs, sim=sim, n_classes=len(labels))[0]
     return rv, labels
 
 
@@ -135,38 +286,12 @@ def accuracy_from_array(conf_mat):
 
 def accuracy_from_colum(conf_mat):
 
-    conf_mat_sim  = conf_mat[:7, :]
-    conf_mat_rsim = conf_mat[7:, :]
-
-    conf_mat_sim  = conf_mat_sim.T
-    conf_mat_rsim = conf_mat_rsim.T
-
-    # Fix this
-    def tmp_fun(conf_mat):
-
-        accuracy = []
-        accuracy_gt = []
-        accuracy_lt = []
-
-        for num_col in range(len(conf_mat)):
-            col_mat = conf_mat[:, num_col]
-
-            accuracy.append(col_mat[num_col] / np.sum(col_mat))
-            accuracy_lt.append(np.sum(col_mat[:num_col]) / np.sum(col_mat))
-            accuracy_gt.append(np.sum(col_mat[num_col:]) / np.sum(col_mat))
-
-        accuracy = [   '{0:.0f}%'.format(100 * ii) for ii in accuracy]
-        accuracy_gt = ['{0:.0f}%'.format(100 * ii) for ii in accuracy_gt]
-        accuracy_lt = ['{0:.0f}%'.format(100 * ii) for ii in accuracy_lt]
-
-        return accuracy, accuracy_gt, accuracy_lt
-
-    accuracy_obs_sim,  accuracy_gt_obs_sim,  accuracy_lt_obs_sim  = tmp_fun(conf_mat_sim)
-    accuracy_obs_sraw, accuracy_gt_obs_sraw, accuracy_lt_obs_sraw = tmp_fun(conf_mat_rsim)
+    n_classes = len(RP_CLASS_LABELS)
+    rates = confusion_accuracy(np.reshape(conf_mat, (2, n_classes, n_classes)))
 
-    accuracy    = [accuracy_obs_sim, accuracy_obs_sraw]
-    accuracy_gt = [accuracy_gt_obs_sim, accuracy_gt_obs_sraw]
-    accuracy_lt = [accuracy_lt_obs_sim, accuracy_lt_obs_sraw]
+    accuracy    = [format_percent(ii) for ii in rates['accuracy']]
+    accuracy_gt = [format_percent(ii) for ii in rates['ge']]
+    accuracy_lt = [format_percent(ii) for ii in rates['le'] - rates['accuracy']]
 
     return accuracy, accuracy_gt, accuracy_lt
 
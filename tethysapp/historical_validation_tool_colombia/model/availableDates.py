@@ -0,0 +1,133 @@
+import datetime as dt
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import CACHE_REQUESTS
+from .upstreamTransport import UPSTREAM
+
+
+######################################################################
+class Available_dates:
+    def __init__(self, url='https://geoglows.ecmwf.int/api/AvailableDates/', ttl=900, error_ttl=60,
+                 timeout=10, max_regions=32):
+        '''
+        Time bounded cache of the GEOGloWS available forecast dates by region.
+        Expired entries are served while they are refreshed in background;
+        the first request of a region waits for its refresh (at most
+        timeout). The dates are kept if the API is down.
+        Input:
+            url         : str   = AvailableDates endpoint
+            ttl         : float = seconds before an entry is refreshed
+            error_ttl   : float = seconds before a failed refresh is retried
+            timeout     : float = seconds to wait for the API
+            max_regions : int   = regions kept (least recently used dropped)
+        '''
+        self.url = url
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.timeout = timeout
+        self.max_regions = max_regions
+
+        # region -> (expiration time, dates)
+        self.__cache = OrderedDict()
+        # region -> threading.Event set when its refresh ends
+        self.__refreshing = {}
+        self.__lock = threading.Lock()
+
+
+    def __call__(self, region):
+        '''
+        Input:
+            region : str = GEOGloWS region (watershed-subbasin)
+        Output:
+            dates  : tuple = ((date_f, date), ...) sorted by date, empty if
+                             the region could not be fetched
+        '''
+        with self.__lock:
+            cached = self.__cache.get(region)
+            if cached is not None:
+                self.__cache.move_to_end(region)
+
+        CACHE_REQUESTS.inc(cache='available_dates', result='miss' if cached is None else 'hit')
+
+        if cached is not None:
+            # Expired -> serve the cached dates and refresh in background
+            if time.time() > cached[0]:
+                self.__start_refresh__(region)
+            return cached[1]
+
+        # New -> wait for the refresh (started by this or another request)
+        done = self.__start_refresh__(region)
+        if done is not None:
+            done.wait(self.timeout)
+
+        with self.__lock:
+            cached = self.__cache.get(region)
+        return () if cached is None else cached[1]
+
+
+    def __start_refresh__(self, region):
+        '''
+        Output:
+            done : threading.Event = set when the refresh of region ends,
+                                     None if too many are running
+        '''
+        with self.__lock:
+            done = self.__refreshing.get(region)
+            # Bounded by max_regions too (regions come from the requests)
+            start = done is None and len(self.__refreshing) < self.max_regions
+            if start:
+                done = self.__refreshing[region] = threading.Event()
+        if start:
+            threading.Thread(target=self.__refresh__, args=(region, ), daemon=True).start()
+        return done
+
+
+    def __refresh__(self, region):
+        try:
+            res = UPSTREAM.get('geoglows', 'AvailableDates', self.url, params={'region' : region},
+                               verify=False, timeout=self.timeout)
+            res.raise_for_status()
+            dates = parse_available_dates(res.json().get('available_dates'))
+            expiration = time.time() + self.ttl
+        except Exception as e:
+            print("error: " + str(e))
+            dates = None
+            expiration = time.time() + self.error_ttl
+
+        with self.__lock:
+            done = self.__refreshing.pop(region)
+            if dates is None:
+                # Failed -> keep the last dates (or none) until error_ttl
+                cached = self.__cache.get(region)
+                dates = () if cached is None else cached[1]
+            self.__cache[region] = (expiration, dates)
+            self.__cache.move_to_end(region)
+            while len(self.__cache) > self.max_regions:
+                self.__cache.popitem(last=False)
+        done.set()
+        return dates
+######################################################################
+
+
+def parse_available_dates(dates_array):
+    '''
+    GEOGloWS dates ('%Y%m%d.%H%M') -> sorted ((date_f, date), ...)
+    '''
+    dates = []
+
+    for date in dates_array:
+        if len(date) == 10:
+            date_mod = date + '000'
+            date_f = dt.datetime.strptime(date_mod, '%Y%m%d.%H%M').strftime('%Y-%m-%d %H:%M')
+        else:
+            date_f = dt.datetime.strptime(date, '%Y%m%d.%H%M').strftime('%Y-%m-%d')
+            date = date[:-3]
+        dates.append((date_f, date))
+
+    return tuple(sorted(dates))
+
+
+# Shared by the whole process
+AVAILABLE_DATES = Available_dates()
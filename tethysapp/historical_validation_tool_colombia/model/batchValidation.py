@@ -0,0 +1,212 @@
+import io
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from .upstreamTransport import UPSTREAM
+
+
+# Metrics of the default report (makeDefaultTable of home.js)
+VALIDATION_METRICS = ['ME', 'RMSE', 'NRMSE (Mean)', 'MAPE', 'NSE', 'KGE (2009)', 'KGE (2012)',
+                      'R (Pearson)', 'R (Spearman)', 'r2']
+
+# Series of the results table: original and bias corrected simulation
+VALIDATION_KINDS = ['sim', 'bc']
+
+HYDROSHARE_DISCHARGE_URL = 'https://www.hydroshare.org/resource/{0}/data/contents/Discharge_Data/{1}.csv'
+
+
+def metric_column(abbr, kind):
+    '''
+    Column of the results table of a hydrostats metric
+    ('KGE (2012)', 'bc') -> 'kge_2012_bc'
+    '''
+    return '{0}_{1}'.format(re.sub(r'[^0-9a-z]+', '_', abbr.lower()).strip('_'), kind)
+
+
+def read_observed(code, resource_id, series_dir=None):
+    '''
+    Observed daily discharge of a station (HydroShare), from series_dir
+    when it was already downloaded
+    Input:
+        code        : str = station code (ID)
+        resource_id : str = HydroShare resource of the discharge data
+        series_dir  : str = folder of the downloaded series (None -> no cache)
+    Output:
+        observed_df : DataFrame = ['Observed Streamflow'] by day
+    '''
+    path = None if series_dir is None else os.path.join(series_dir, 'observed', '{0}.csv'.format(code))
+
+    if path is not None and os.path.isfile(path):
+        df = pd.read_csv(path, index_col=0)
+    else:
+        res = UPSTREAM.get('hydroshare', 'Discharge_Data', HYDROSHARE_DISCHARGE_URL.format(resource_id, code),
+                           verify=False)
+        res.raise_for_status()
+        df = pd.read_csv(io.StringIO(res.content.decode('utf-8')), index_col=0)
+        _savecsv(df, path)
+
+    observed_df = pd.DataFrame(data=pd.to_numeric(df.iloc[:, 0], errors='coerce').values,
+                               index=pd.to_datetime(df.index).normalize(),
+                               columns=['Observed Streamflow'])
+    observed_df.index.name = 'datetime'
+    return observed_df.dropna().sort_index()
+
+
+def read_simulated(comid, series_dir=None):
+    '''
+    GEOGloWS historic simulation (ERA 5) of a reach, from series_dir when it
+    was already downloaded
+    Output:
+        simulated_df : DataFrame = ['Simulated Streamflow'] by day, >= 0
+    '''
+    import geoglows
+
+    path = None if series_dir is None else os.path.join(series_dir, 'simulated', '{0}.csv'.format(comid))
+
+    if path is not None and os.path.isfile(path):
+        df = pd.read_csv(path, index_col=0)
+    else:
+        df = UPSTREAM.call('geoglows', 'HistoricSimulation', geoglows.streamflow.historic_simulation,
+                           str(comid), forcing='era_5', return_format='csv')
+        _savecsv(df, path)
+
+    simulated_df = pd.DataFrame(data=np.maximum(df.iloc[:, 0].values, 0),
+                                index=pd.to_datetime(df.index).normalize(),
+                                columns=['Simulated Streamflow'])
+    simulated_df.index.name = 'Datetime'
+    return simulated_df.sort_index()
+
+
+def validate_station(station, resource_id, metrics=VALIDATION_METRICS, series_dir=None):
+    '''
+    Metrics of the original and bias corrected simulation of one station
+    (same steps as get_popup_response, get_hydrographs and make_table_ajax)
+    Input:
+        station     : dict = 'ID', 'new_COMID', 'Name', 'Latitude',
+                             'Longitude', 'region' (station properties)
+        resource_id : str  = HydroShare resource of the discharge data
+        metrics     : list = hydrostats metric abbreviations
+        series_dir  : str  = folder of the downloaded series
+    Output:
+        rv          : dict = row of the results table
+    '''
+    import geoglows
+    import hydrostats as hs
+    import hydrostats.data as hd
+
+    # Malformed properties -> row with the error (the rest of the chunk goes on)
+    rv = {'station_id' : np.nan,
+          'comid'      : np.nan,
+          'name'       : station.get('Name', ''),
+          'latitude'   : np.nan,
+          'longitude'  : np.nan,
+          'region'     : station.get('region', ''),
+          'n_obs'      : 0,
+          'error'      : ''}
+    rv.update({metric_column(abbr, kind) : np.nan for kind in VALIDATION_KINDS for abbr in metrics})
+
+    try:
+        rv['station_id'] = int(station['ID'])
+        rv['comid'] = int(station['new_COMID'])
+        rv['latitude'] = float(station['Latitude'])
+        rv['longitude'] = float(station['Longitude'])
+
+        observed_df = read_observed(station['ID'], resource_id, series_dir=series_dir)
+        simulated_df = read_simulated(station['new_COMID'], series_dir=series_dir)
+        corrected_df = geoglows.bias.correct_historical(simulated_df, observed_df)
+
+        for kind, sim_df in zip(VALIDATION_KINDS, [simulated_df, corrected_df]):
+            merged_df = hd.merge_data(sim_df=sim_df, obs_df=observed_df)
+            table = hs.make_table(merged_dataframe=merged_df, metrics=list(metrics))
+            for abbr in metrics:
+                rv[metric_column(abbr, kind)] = float(table[abbr].iloc[0])
+            rv['n_obs'] = len(merged_df)
+
+    except Exception as e:
+        rv['error'] = '{0}: {1}'.format(type(e).__name__, e)
+
+    return rv
+
+
+def validate_stations(stations, resource_id, metrics=VALIDATION_METRICS, series_dir=None):
+    '''
+    validate_station of a chunk of stations (task of the process pool)
+    '''
+    return [validate_station(station, resource_id, metrics=metrics, series_dir=series_dir)
+            for station in stations]
+
+
+def run_regional_validation(stations, resource_id, metrics=VALIDATION_METRICS, series_dir=None,
+                            n_jobs=None, chunk_size=8, upstream_config=None):
+    '''
+    Metrics of every station, spread over a process pool by chunks
+    Input:
+        stations        : list = station properties (IDEAM_Stations_v2.json)
+        resource_id     : str  = HydroShare resource of the discharge data
+        metrics         : list = hydrostats metric abbreviations
+        series_dir      : str  = folder of the downloaded series
+        n_jobs          : int  = worker processes (None -> no pool)
+        chunk_size      : int  = stations by task
+        upstream_config : dict = Upstream_transport.configure arguments of
+                                 the workers (None -> environment)
+    Output:
+        rv              : DataFrame = one row by station (columnar table)
+    '''
+    chunks = [stations[ii:ii + chunk_size] for ii in range(0, len(stations), chunk_size)]
+    rows = []
+
+    if n_jobs is None or n_jobs < 2 or len(chunks) < 2:
+        for chunk in chunks:
+            rows += validate_stations(chunk, resource_id, metrics=metrics, series_dir=series_dir)
+            print('{0}/{1} stations validated.'.format(len(rows), len(stations)))
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_initworker,
+                                 initargs=(upstream_config, )) as executor:
+            jobs = [executor.submit(validate_stations, chunk, resource_id, metrics, series_dir)
+                    for chunk in chunks]
+            for job in as_completed(jobs):
+                rows += job.result()
+                print('{0}/{1} stations validated.'.format(len(rows), len(stations)))
+
+    columns = ['station_id', 'comid', 'name', 'latitude', 'longitude', 'region', 'n_obs']
+    columns += [metric_column(abbr, kind) for kind in VALIDATION_KINDS for abbr in metrics]
+    columns += ['error']
+
+    rv = pd.DataFrame(rows, columns=columns)
+    return rv.sort_values('station_id').reset_index(drop=True)
+
+
+def write_results_table(table, path_dir):
+    '''
+    Results table as Parquet (.parquet, needs pyarrow) or CSV (other names)
+    '''
+    os.makedirs(os.path.dirname(os.path.abspath(path_dir)), exist_ok=True)
+    if path_dir.endswith('.parquet'):
+        table.to_parquet(path_dir, index=False)
+    else:
+        table.to_csv(path_dir, index=False)
+
+
+def read_results_table(path_dir):
+    if path_dir.endswith('.parquet'):
+        return pd.read_parquet(path_dir)
+    return pd.read_csv(path_dir, keep_default_na=True, dtype={'name' : str, 'region' : str, 'error' : str})
+
+
+def _savecsv(df, path):
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    df.to_csv(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _initworker(upstream_config):
+    if upstream_config is not None:
+        UPSTREAM.configure(**upstream_config)
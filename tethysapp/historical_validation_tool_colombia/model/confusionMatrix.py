@@ -0,0 +1,85 @@
+import numpy as np
+
+
+# Return period classes -> 0 : < 2 years, 1 : 2-5, ..., 6 : >= 100 years
+RP_CLASS_LABELS = [0, 1, 2, 3, 4, 5, 6]
+
+
+# Main functions
+##############################################################################
+def classify_return_period(flows, thresholds):
+    """
+    Input:
+        flows      : array = streamflow (time) or (stations x time)
+        thresholds : array = increasing return period flows, shared (rp) or
+                             per station (stations x rp)
+    Output:
+        rv         : array = return period class of every flow, -1 for NaN
+    """
+    flows = np.asarray(flows, dtype=float)
+    thresholds = np.asarray(thresholds, dtype=float)
+
+    if thresholds.ndim == 1:
+        rv = np.digitize(flows, thresholds)
+    else:
+        # Per station thresholds: same rule of digitize (bins[i-1] <= x < bins[i])
+        # accumulated over the few return periods instead of the time steps.
+        flows = np.atleast_2d(flows)
+        rv = np.zeros(flows.shape, dtype=int)
+        for col in range(thresholds.shape[1]):
+            rv += flows >= thresholds[:, col:col + 1]
+
+    return np.where(np.isnan(flows), -1, rv)
+
+
+def confusion_matrices(obs, sim, n_classes=len(RP_CLASS_LABELS)):
+    """
+    Input:
+        obs       : array = observed classes (time) or (stations x time)
+        sim       : array = simulated classes, same shape of obs
+        n_classes : int   = number of classes
+    Output:
+        rv        : array = confusion matrices (stations x obs x sim). Pairs
+                            with a class out of [0, n_classes) are skipped.
+    """
+    obs = np.atleast_2d(np.asarray(obs, dtype=int))
+    sim = np.atleast_2d(np.asarray(sim, dtype=int))
+
+    valid = (obs >= 0) & (obs < n_classes) & (sim >= 0) & (sim < n_classes)
+    station = np.broadcast_to(np.arange(len(obs))[:, None], obs.shape)
+
+    idx = (station * n_classes + obs) * n_classes + sim
+    rv = np.bincount(idx[valid], minlength=len(obs) * n_classes * n_classes)
+    return rv.reshape(len(obs), n_classes, n_classes)
+
+
+def confusion_accuracy(conf_mat):
+    """
+    Input:
+        conf_mat : array = confusion matrices (... x obs x sim)
+    Output:
+        rv       : dict  = for every observed class (... x obs):
+                           'accuracy' : sim == obs
+                           'ge'       : sim >= obs
+                           'le'       : sim <= obs
+    """
+    conf_mat = np.asarray(conf_mat, dtype=float)
+    diag = np.diagonal(conf_mat, axis1=-2, axis2=-1)
+    cum = np.cumsum(conf_mat, axis=-1)
+    total = cum[..., -1]
+
+    le = np.diagonal(cum, axis1=-2, axis2=-1)
+    ge = total - le + diag
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {'accuracy' : diag / total,
+                'ge'       : ge / total,
+                'le'       : le / total}
+
+
+def format_percent(values):
+    '''
+    Presentation helper -> ['{0:.0f}%', ...]
+    '''
+    return ['{0:.0f}%'.format(100 * ii) for ii in np.ravel(values)]
+##############################################################################
@@ -0,0 +1,53 @@
+from .scatterDensity import SCATTER_BINS, SCATTER_MARKERS_LIMIT
+
+
+# plotly is imported by the functions (first figure), not with the model
+def hydrograph_figure(observed_df, simulated_df, corrected_df, station_code, station_name):
+    """
+    Observed, simulated and bias corrected streamflow figure (get_hydrographs)
+    """
+    import plotly.graph_objs as go
+
+    observed_Q = go.Scatter(x=observed_df.index, y=observed_df.iloc[:, 0].values, name='Observed', )
+    simulated_Q = go.Scatter(x=simulated_df.index, y=simulated_df.iloc[:, 0].values, name='Simulated', )
+    corrected_Q = go.Scatter(x=corrected_df.index, y=corrected_df.iloc[:, 0].values, name='Corrected Simulated', )
+
+    layout = go.Layout(
+        title='Observed & Simulated Streamflow at <br> {0} - {1}'.format(station_code, station_name),
+        xaxis=dict(title='Dates', ), yaxis=dict(title='Discharge (m<sup>3</sup>/s)', autorange=True),
+        showlegend=True)
+
+    return go.Figure(data=[observed_Q, simulated_Q, corrected_Q], layout=layout)
+
+
+def scatter_traces(scatter, log=False, mode='auto'):
+    """
+    Original and corrected scatter traces: every pair ('markers') or the
+    non empty bins of a 2-D histogram ('density'); 'auto' bins the stations
+    with more than SCATTER_MARKERS_LIMIT pairs
+    """
+    import plotly.graph_objs as go
+
+    if mode == 'auto':
+        mode = 'density' if len(scatter) > SCATTER_MARKERS_LIMIT else 'markers'
+
+    traces = []
+    for name, color in [('original', '#ef553b'), ('corrected', '#00cc96')]:
+        if mode != 'density':
+            sim, obs = scatter.series[name]
+            traces.append(go.Scatter(x=sim, y=obs, mode='markers', name=name, marker=dict(color=color)))
+            continue
+
+        x, y, counts = scatter.histogram(name, bins=SCATTER_BINS, log=log)
+        traces.append(go.Scatter(
+            x=x,
+            y=y,
+            mode='markers',
+            name='{0} (binned)'.format(name),
+            text=counts,
+            hovertemplate='%{x:.2f}, %{y:.2f}<br>%{text} days',
+            marker=dict(color=color, opacity=0.6, sizemode='area', sizemin=3,
+                        size=counts, sizeref=2 * counts.max(initial=1) / 20 ** 2)
+        ))
+
+    return traces
@@ -0,0 +1,74 @@
+import os
+import threading
+from collections import OrderedDict
+
+from .metrics import CACHE_REQUESTS
+
+
+######################################################################
+class File_cache:
+    def __init__(self, max_entries=None):
+        '''
+        Process level cache of objects built from files. An entry is rebuilt
+        when the modification time of any of its source files changes.
+        Entries are built under their own lock (one build by entry, other
+        entries are served meanwhile). Builders may use the cache themselves.
+        Input:
+            max_entries : int = entries kept, least recently used dropped
+                                (None -> unbounded)
+        '''
+        self.max_entries = max_entries
+
+        self.__cache = OrderedDict()
+        self.__building = {}
+        self.__lock = threading.Lock()
+
+
+    def __call__(self, key, paths, builder):
+        '''
+        Input:
+            key     : hashable = cache entry name
+            paths   : list     = source files of the entry
+            builder : callable = function without arguments that builds
+                                 the entry
+        Output:
+            rv      : object   = cached (shared, read-only) entry
+        '''
+        mtimes = tuple(os.path.getmtime(path) for path in paths)
+
+        with self.__lock:
+            cached = self.__cache.get(key)
+            hit = cached is not None and cached[0] == mtimes
+            if hit:
+                self.__cache.move_to_end(key)
+            else:
+                key_lock = self.__building.setdefault(key, threading.RLock())
+
+        if not hit:
+            with key_lock:
+                # Built by another thread while waiting
+                with self.__lock:
+                    cached = self.__cache.get(key)
+                hit = cached is not None and cached[0] == mtimes
+                if not hit:
+                    cached = (mtimes, builder())
+                    with self.__lock:
+                        self.__cache[key] = cached
+                        self.__cache.move_to_end(key)
+                        self.__building.pop(key, None)
+                        while self.max_entries is not None and len(self.__cache) > self.max_entries:
+                            self.__cache.popitem(last=False)
+
+        CACHE_REQUESTS.inc(cache='file_cache', result='hit' if hit else 'miss')
+
+        return cached[1]
+
+
+    def clear(self):
+        with self.__lock:
+            self.__cache.clear()
+            self.__building.clear()
+######################################################################
+
+# Shared by the whole process
+FILE_CACHE = File_cache()
@@ -0,0 +1,124 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+
+# dtype of the ensemble members. np.float32 halves the memory but the files
+# written from it (forecast_ens.json -> CSV downloads) get float32 digits
+# (12.345 -> 12.345000267), so the views keep the API precision
+ENSEMBLE_DTYPE = np.float64
+
+# High resolution member of the GEOGloWS ensembles
+HIGH_RES_COLUMN = 'ensemble_52_m^3/s'
+
+# Columns of the forecast stats (geoglows.plots.forecast_stats)
+ENSEMBLE_STATS_COLUMNS = ['flow_max_m^3/s', 'flow_75%_m^3/s', 'flow_avg_m^3/s',
+                          'flow_25%_m^3/s', 'flow_min_m^3/s', 'high_res_m^3/s']
+
+
+def naive_index(index):
+    '''
+    Datetime index without time zone (wall time) and sub seconds, the same
+    of the strftime("%Y-%m-%d %H:%M:%S") -> pd.to_datetime round trip
+    '''
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.floor('s')
+
+
+def read_api_csv(content, dates=True):
+    '''
+    CSV response of the GEOGloWS API (ForecastRecords, ReturnPeriods), read
+    as geoglows.streamflow does
+    Input:
+        content : bytes = CSV response
+        dates   : bool  = datetime index
+    '''
+    df = pd.read_csv(io.BytesIO(content), index_col=0)
+    if dates:
+        df.index = pd.to_datetime(df.index)
+    return df
+
+
+def read_forecast_ensemble(content, dtype=ENSEMBLE_DTYPE):
+    '''
+    ForecastEnsembles CSV (GEOGloWS API) as one 2-D block
+    Input:
+        content      : bytes = CSV response
+        dtype        : dtype = dtype of the members
+    Output:
+        forecast_ens : DataFrame = members >= 0 by time ('Datetime')
+    '''
+    header = content[:content.find(b'\n')].decode('utf-8').strip().split(',')
+    df = pd.read_csv(io.BytesIO(content), index_col=0, dtype={column : dtype for column in header[1:]})
+
+    values = df.to_numpy(dtype=dtype, copy=True)
+    np.maximum(values, 0, out=values)
+
+    forecast_ens = pd.DataFrame(values, index=naive_index(df.index), columns=df.columns, copy=False)
+    forecast_ens.index.name = 'Datetime'
+    return forecast_ens
+
+
+def clip_ensemble(forecast_ens, min_simulated, max_simulated):
+    '''
+    Clip the members to the simulated range of the month
+    Input:
+        forecast_ens  : DataFrame = members by time, NaN kept
+        min_simulated : float     = min simulated flow of the month
+        max_simulated : float     = max simulated flow of the month
+    Output:
+        clipped       : DataFrame = new frame of the clipped members
+                                    (forecast_ens is not changed)
+        factor        : array     = value / min_simulated below the range,
+                                    value / max_simulated above it and 1
+                                    inside (applied to the bias corrected
+                                    members)
+    '''
+    values = forecast_ens.to_numpy(copy=True)
+    below = values < min_simulated
+    above = values > max_simulated
+
+    factor = np.ones_like(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor[below] = values[below] / min_simulated
+        factor[above] = values[above] / max_simulated
+    factor[np.isnan(values)] = np.nan
+
+    np.clip(values, min_simulated, max_simulated, out=values)
+    clipped = pd.DataFrame(values, index=forecast_ens.index, columns=forecast_ens.columns, copy=False)
+    return clipped, factor
+
+
+def ensemble_stats(forecast_ens, high_res_column=HIGH_RES_COLUMN):
+    '''
+    Forecast stats of an ensemble: max, 75 %, mean, 25 % and min of the
+    members (times with every member) and the high resolution member
+    Input:
+        forecast_ens    : DataFrame = members by time
+        high_res_column : str       = high resolution member
+    Output:
+        stats           : DataFrame = ENSEMBLE_STATS_COLUMNS by time
+    '''
+    values = forecast_ens.to_numpy()
+    high_res = forecast_ens.columns.get_loc(high_res_column)
+
+    high_res_rows = ~np.isnan(values[:, high_res])
+    members = np.delete(values, high_res, axis=1)
+    members_rows = ~np.isnan(members).any(axis=1)
+    rows = members_rows | high_res_rows
+
+    stats = np.full((rows.sum(), len(ENSEMBLE_STATS_COLUMNS)), np.nan)
+    stats[:, 5] = values[rows, high_res]
+
+    members = members[members_rows]
+    if len(members) > 0:
+        members_pos = np.flatnonzero(members_rows[rows])
+        stats[np.ix_(members_pos, [0, 1, 3, 4])] = np.quantile(members, [1, 0.75, 0.25, 0], axis=1).T
+        stats[members_pos, 2] = members.mean(axis=1, dtype=np.float64)
+
+    rv = pd.DataFrame(stats, index=forecast_ens.index[rows], columns=ENSEMBLE_STATS_COLUMNS)
+    rv.index.name = 'Datetime'
+    return rv
@@ -0,0 +1,404 @@
+import os
+import json
+import math
+import numpy as np
+
+from .fileCache import File_cache, FILE_CACHE
+
+
+# Simplification levels -> tolerance in degrees (0 = original geometry)
+SIMPLIFY_LEVELS = {0 : 0,
+                   1 : 0.0002,
+                   2 : 0.001,
+                   3 : 0.005}
+
+# Boundary layers (folders of public) and their index files
+BOUNDARY_LAYERS = {'geojson'  : 'index.json',
+                   'geojson2' : 'index2.json',
+                   'geojson3' : 'index3.json'}
+
+# Extent files (bbox, centroid, area) stored next to the index files
+BOUNDARY_EXTENTS = {'geojson'  : 'extent.json',
+                    'geojson2' : 'extent2.json',
+                    'geojson3' : 'extent3.json'}
+
+# Boundaries (GeoJSON text) kept in memory, prebuilt or simplified on the fly
+BOUNDARY_CACHE_SIZE = 64
+
+# Mean earth radius (km)
+EARTH_RADIUS = 6371.0088
+
+
+# Shared by the whole process (bounded, unlike FILE_CACHE)
+BOUNDARY_CACHE = File_cache(max_entries=BOUNDARY_CACHE_SIZE)
+
+
+# Main functions
+##############################################################################
+def douglas_peucker(points, tolerance):
+    """
+    Input:
+        points    : array = line coordinates (n x 2)
+        tolerance : float = max distance of the removed points to the line
+    Output:
+        rv        : array = simplified line (first and last points are kept)
+    """
+    points = np.asarray(points, dtype=float)
+    if tolerance <= 0 or len(points) < 3:
+        return points
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        start = points[first]
+        seg = points[last] - start
+        rel = points[first + 1:last] - start
+        seg_len = math.hypot(seg[0], seg[1])
+
+        if seg_len == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / seg_len
+
+        num_max = int(np.argmax(dist))
+        if dist[num_max] > tolerance:
+            split = first + 1 + num_max
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return points[keep]
+
+
+def simplify_ring(ring, tolerance):
+    '''
+    Simplify a closed ring keeping at least 4 points (valid ring)
+    '''
+    ring = np.asarray(ring, dtype=float)
+    if len(ring) <= 4:
+        return ring
+
+    # Split the ring at its farthest point from the start -> stable ends
+    num_far = int(np.argmax(np.hypot(*(ring - ring[0]).T)))
+    rv = np.vstack([douglas_peucker(ring[:num_far + 1], tolerance)[:-1],
+                    douglas_peucker(ring[num_far:], tolerance)])
+
+    return rv if len(rv) >= 4 else ring
+
+
+def simplify_geometry(geometry, tolerance, decimals=None):
+    """
+    Input:
+        geometry  : dict  = GeoJSON geometry
+        tolerance : float = Douglas-Peucker tolerance (degrees)
+        decimals  : int   = coordinates quantization (None -> no rounding)
+    Output:
+        rv        : dict  = simplified GeoJSON geometry
+    """
+    def line(coords):
+        rv = douglas_peucker(coords, tolerance)
+        return (rv if decimals is None else np.round(rv, decimals)).tolist()
+
+    def polygon(rings):
+        rv = [simplify_ring(ring, tolerance) for ring in rings]
+        return [(ring if decimals is None else np.round(ring, decimals)).tolist() for ring in rv]
+
+    geom_type = geometry['type']
+    coords = geometry.get('coordinates')
+
+    if geom_type == 'Polygon':
+        coords = polygon(coords)
+    elif geom_type == 'MultiPolygon':
+        coords = [polygon(rings) for rings in coords]
+    elif geom_type == 'LineString':
+        coords = line(coords)
+    elif geom_type == 'MultiLineString':
+        coords = [line(ii) for ii in coords]
+    elif geom_type == 'GeometryCollection':
+        return {'type' : geom_type,
+                'geometries' : [simplify_geometry(ii, tolerance, decimals) for ii in geometry['geometries']]}
+
+    return {'type' : geom_type, 'coordinates' : coords}
+
+
+def simplify_geojson(geojson, level):
+    """
+    Input:
+        geojson : dict = GeoJSON FeatureCollection
+        level   : int  = key of SIMPLIFY_LEVELS
+    Output:
+        rv      : dict = simplified and quantized FeatureCollection
+    """
+    tolerance = SIMPLIFY_LEVELS[level]
+    if tolerance == 0:
+        return geojson
+
+    # Keep one decimal more than the tolerance
+    decimals = int(math.ceil(-math.log10(tolerance))) + 1
+
+    features = []
+    for feature in geojson['features']:
+        feature = dict(feature)
+        if feature.get('geometry') is not None:
+            feature['geometry'] = simplify_geometry(feature['geometry'], tolerance, decimals)
+        features.append(feature)
+
+    return {'type' : 'FeatureCollection', 'features' : features}
+
+
+def level_for_extent(bbox, pixels=1500):
+    '''
+    Coarsest level whose tolerance stays under one screen pixel when the
+    bbox [min_lon, min_lat, max_lon, max_lat] fills the map.
+    '''
+    pixel_size = max(bbox[2] - bbox[0], bbox[3] - bbox[1]) / pixels
+    valid = [level for level, tolerance in SIMPLIFY_LEVELS.items() if tolerance <= pixel_size]
+    return max(valid)
+
+
+def geojson_bbox(geojson):
+    '''
+    FeatureCollection -> [min_lon, min_lat, max_lon, max_lat]
+    '''
+    coords = []
+
+    def walk(item):
+        if isinstance(item[0], (int, float)):
+            coords.append(item[:2])
+        else:
+            for ii in item:
+                walk(ii)
+
+    for feature in geojson['features']:
+        geometry = feature.get('geometry') or {}
+        for geom in geometry.get('geometries', [geometry]):
+            if geom.get('coordinates'):
+                walk(geom['coordinates'])
+
+    coords = np.asarray(coords, dtype=float)
+    return coords.min(axis=0).tolist() + coords.max(axis=0).tolist()
+
+
+def geojson_extent(geojson):
+    '''
+    FeatureCollection -> {'bbox' : [min_lon, min_lat, max_lon, max_lat],
+                          'centroid' : [lon, lat], 'area' : km2,
+                          'features' : number of features}
+    '''
+    rings = []
+
+    def polygon(coords):
+        for num_ring, ring in enumerate(coords):
+            rings.append((np.asarray(ring, dtype=float)[:, :2], -1 if num_ring > 0 else 1))
+
+    for feature in geojson['features']:
+        geometry = feature.get('geometry') or {}
+        for geom in geometry.get('geometries', [geometry]):
+            if geom.get('type') == 'Polygon':
+                polygon(geom['coordinates'])
+            elif geom.get('type') == 'MultiPolygon':
+                for coords in geom['coordinates']:
+                    polygon(coords)
+
+    bbox = geojson_bbox(geojson)
+
+    # Shoelace over the rings (holes subtract) in degrees
+    area = 0.0
+    area_km2 = 0.0
+    cent = np.zeros(2)
+    for ring, sign in rings:
+        x, y = ring[:, 0], ring[:, 1]
+        cross = x[:-1] * y[1:] - x[1:] * y[:-1]
+        ring_area = sign * abs(cross.sum()) / 2.0
+        if cross.sum() == 0:
+            continue
+        ring_cent = np.array([((x[:-1] + x[1:]) * cross).sum(), ((y[:-1] + y[1:]) * cross).sum()]) / (3.0 * cross.sum())
+        area += ring_area
+        cent += ring_area * ring_cent
+
+        # Degrees -> km2 with the scale of the ring mean latitude
+        scale = (np.deg2rad(1) * EARTH_RADIUS) ** 2 * np.cos(np.deg2rad(y.mean()))
+        area_km2 += ring_area * scale
+
+    if area != 0:
+        centroid = (cent / area).tolist()
+    else:
+        centroid = [(bbox[0] + bbox[2]) / 2.0, (bbox[1] + bbox[3]) / 2.0]
+
+    return {'bbox'     : [round(ii, 6) for ii in bbox],
+            'centroid' : [round(ii, 6) for ii in centroid],
+            'area'     : round(area_km2, 3),
+            'features' : len(geojson['features'])}
+
+
+def build_boundary_extents(public_dir):
+    """
+    Build step: write the extent file (BOUNDARY_EXTENTS) of every layer,
+    {file : geojson_extent(file)}, next to its index file.
+    Input:
+        public_dir : str = app public folder
+    """
+    for layer in BOUNDARY_LAYERS:
+        src_dir = os.path.join(public_dir, layer)
+
+        extents = {}
+        for file_name in sorted(os.listdir(src_dir)):
+            if not file_name.endswith('.json') or file_name in [BOUNDARY_LAYERS[layer], BOUNDARY_EXTENTS[layer]]:
+                continue
+            extents[file_name] = geojson_extent(_readjson(os.path.join(src_dir, file_name)))
+
+        with open(os.path.join(src_dir, BOUNDARY_EXTENTS[layer]), 'w') as f:
+            json.dump(extents, f, indent=1)
+
+        print('{0}/{1} built.'.format(layer, BOUNDARY_EXTENTS[layer]))
+
+
+def get_boundary_extents(public_dir, layer):
+    '''
+    Cached extent file of the layer, {} if it was not built
+    '''
+    extent_file = os.path.join(public_dir, layer, BOUNDARY_EXTENTS[layer])
+    if not os.path.isfile(extent_file):
+        return {}
+
+    return FILE_CACHE(key=('boundary extents', extent_file),
+                      paths=[extent_file],
+                      builder=lambda: _readjson(extent_file))
+
+
+def build_simplified_geojsons(public_dir, out_dir_name='geojson_simplified'):
+    """
+    Build step: write every boundary file of BOUNDARY_LAYERS at every level
+    into public/<out_dir_name>/<layer>/<level>/<file>
+    Input:
+        public_dir   : str = app public folder
+        out_dir_name : str = output folder (inside public)
+    """
+    for layer in BOUNDARY_LAYERS:
+        src_dir = os.path.join(public_dir, layer)
+
+        for file_name in sorted(os.listdir(src_dir)):
+            if not file_name.endswith('.json') or file_name in [BOUNDARY_LAYERS[layer], BOUNDARY_EXTENTS[layer]]:
+                continue
+
+            with open(os.path.join(src_dir, file_name)) as f:
+                geojson = json.load(f)
+
+            for level in SIMPLIFY_LEVELS:
+                if level == 0:
+                    continue
+
+                out_dir = os.path.join(public_dir, out_dir_name, layer, str(level))
+                os.makedirs(out_dir, exist_ok=True)
+                with open(os.path.join(out_dir, file_name), 'w') as f:
+                    json.dump(simplify_geojson(geojson, level), f, separators=(',', ':'))
+
+            print('{0}/{1} simplified.'.format(layer, file_name))
+
+
+def get_boundary_geojson(public_dir, layer, file_name, level='auto', out_dir_name='geojson_simplified'):
+    """
+    Input:
+        public_dir   : str = app public folder
+        layer        : str = key of BOUNDARY_LAYERS
+        file_name    : str = boundary file listed in the index of the layer
+        level        : str = key of SIMPLIFY_LEVELS or 'auto'
+        out_dir_name : str = folder of build_simplified_geojsons
+    Output:
+        rv           : str = GeoJSON text, None if the file does not exist
+    """
+    source = _boundarysource(public_dir, layer, file_name, level, out_dir_name)
+    if source is None:
+        return None
+    src_file, level, built_file = source
+
+    # Original geometry -> not kept in memory
+    if level == 0:
+        return _readtext(src_file)
+
+    # Prebuilt file (build step) when it is up to date
+    if built_file is not None:
+        return BOUNDARY_CACHE(key=('boundary', built_file),
+                              paths=[built_file],
+                              builder=lambda: _readtext(built_file))
+
+    # Missing prebuilt file (scripts/build_boundaries.py) -> simplified on the fly
+    return BOUNDARY_CACHE(key=('boundary', src_file, level),
+                          paths=[src_file],
+                          builder=lambda: json.dumps(simplify_geojson(_readjson(src_file), level),
+                                                     separators=(',', ':')))
+
+
+def get_boundary_file(public_dir, layer, file_name, level='auto', out_dir_name='geojson_simplified'):
+    """
+    Same input as get_boundary_geojson
+    Output:
+        rv : str = path of the file on disk with the boundary at the
+                   requested level (may have precompressed siblings), None
+                   if it has to be simplified on the fly or does not exist
+    """
+    source = _boundarysource(public_dir, layer, file_name, level, out_dir_name)
+    if source is None:
+        return None
+    src_file, level, built_file = source
+
+    return src_file if level == 0 else built_file
+
+
+def _boundarysource(public_dir, layer, file_name, level, out_dir_name):
+    '''
+    Validated (src_file, level, built_file) of a boundary request. built_file
+    is None when the prebuilt file is missing or older than its source.
+    '''
+    if layer not in BOUNDARY_LAYERS:
+        return None
+
+    index_file = os.path.join(public_dir, layer, BOUNDARY_LAYERS[layer])
+    index = FILE_CACHE(key=('boundary index', index_file),
+                       paths=[index_file],
+                       builder=lambda: _readindex(index_file))
+
+    src_file = os.path.join(public_dir, layer, file_name)
+    if file_name not in index or not os.path.isfile(src_file):
+        return None
+
+    extent = get_boundary_extents(public_dir, layer).get(file_name)
+    if level == 'auto' and extent is not None:
+        level = level_for_extent(extent['bbox'])
+    elif level == 'auto':
+        level = FILE_CACHE(key=('boundary level', src_file),
+                           paths=[src_file],
+                           builder=lambda: level_for_extent(geojson_bbox(_readjson(src_file))))
+    level = int(level)
+    if level not in SIMPLIFY_LEVELS:
+        return None
+
+    built_file = os.path.join(public_dir, out_dir_name, layer, str(level), file_name)
+    if level == 0 or not os.path.isfile(built_file) or os.path.getmtime(built_file) < os.path.getmtime(src_file):
+        built_file = None
+
+    return src_file, level, built_file
+
+
+def _readtext(path_dir):
+    with open(path_dir) as f:
+        return f.read()
+
+
+def _readjson(path_dir):
+    with open(path_dir) as f:
+        return json.load(f)
+
+
+def _readindex(path_dir):
+    '''
+    Index of a boundary layer -> set of its files
+    '''
+    return {file_name for item in _readjson(path_dir).values() for file_name in item['geojsons']}
+##############################################################################
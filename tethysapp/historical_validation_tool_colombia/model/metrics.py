@@ -0,0 +1,259 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+# Prefix of every metric name
+METRICS_PREFIX = 'hvt_colombia'
+
+# Default histogram buckets
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = tuple(1024 * 4 ** ii for ii in range(9))
+
+
+######################################################################
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        '''
+        Base of the metrics: one value by combination of label values
+        Input:
+            name      : str   = metric name (without METRICS_PREFIX)
+            help_text : str   = description (# HELP)
+            labels    : tuple = label names
+        '''
+        self.name = '{0}_{1}'.format(METRICS_PREFIX, name)
+        self.help_text = help_text
+        self.labels = tuple(labels)
+
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError('{0} labels are {1}'.format(self.name, self.labels))
+        return tuple(str(labels[label]) for label in self.labels)
+
+
+    def _labels_text(self, key, extra=()):
+        items = list(zip(self.labels, key)) + list(extra)
+        if len(items) == 0:
+            return ''
+        return '{' + ','.join('{0}="{1}"'.format(label, _escape(value)) for label, value in items) + '}'
+
+
+    def render(self):
+        '''
+        Output:
+            rv : list = lines of the metric in Prometheus text format
+        '''
+        rv = ['# HELP {0} {1}'.format(self.name, self.help_text),
+              '# TYPE {0} {1}'.format(self.name, self.kind)]
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            rv += self._samples(key, value)
+        return rv
+
+
+    def clear(self):
+        '''
+        Drop every label combination (series no longer reported)
+        '''
+        with self._lock:
+            self._values.clear()
+
+
+    def _samples(self, key, value):
+        return ['{0}{1} {2}'.format(self.name, self._labels_text(key), _number(value))]
+######################################################################
+
+
+######################################################################
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+######################################################################
+
+
+######################################################################
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+######################################################################
+
+
+######################################################################
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=SECONDS_BUCKETS):
+        '''
+        Input: same as Metric and
+            buckets : tuple = upper bounds of the buckets (+Inf is added)
+        '''
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            counts = list(counts)
+            for num_bucket, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[num_bucket] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+
+    @contextmanager
+    def time(self, **labels):
+        '''
+        Observe the seconds spent in a block
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+    def _samples(self, key, value):
+        counts, total = value
+        rv, cumulative = [], 0
+        for bound, count in zip(self.buckets + (math.inf, ), counts):
+            cumulative += count
+            le = (('le', '+Inf' if bound == math.inf else _number(bound)), )
+            rv.append('{0}_bucket{1} {2}'.format(self.name, self._labels_text(key, le), cumulative))
+        rv.append('{0}_sum{1} {2}'.format(self.name, self._labels_text(key), _number(total)))
+        rv.append('{0}_count{1} {2}'.format(self.name, self._labels_text(key), cumulative))
+        return rv
+######################################################################
+
+
+######################################################################
+class Metrics_registry:
+    def __init__(self):
+        '''
+        Process level metrics exposed in Prometheus text format. Metrics are
+        created once by name and shared.
+        '''
+        self.__metrics = OrderedDict()
+        self.__lock = threading.Lock()
+
+
+    def counter(self, name, help_text, labels=()):
+        return self.__register__(Counter, name, help_text, labels)
+
+
+    def gauge(self, name, help_text, labels=()):
+        return self.__register__(Gauge, name, help_text, labels)
+
+
+    def histogram(self, name, help_text, labels=(), buckets=SECONDS_BUCKETS):
+        return self.__register__(Histogram, name, help_text, labels, buckets=buckets)
+
+
+    def render(self):
+        '''
+        Output:
+            rv : str = all the metrics in Prometheus text format (0.0.4)
+        '''
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+    def __register__(self, cls, name, help_text, labels, **kwargs):
+        with self.__lock:
+            metric = self.__metrics.get(name)
+            if metric is None:
+                metric = cls(name, help_text, labels, **kwargs)
+                self.__metrics[name] = metric
+            elif not isinstance(metric, cls) or metric.labels != tuple(labels):
+                raise ValueError('Metric {0} already registered as {1}{2}'.format(name, metric.kind, metric.labels))
+        return metric
+######################################################################
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Shared by the whole process
+METRICS = Metrics_registry()
+
+UPSTREAM_REQUESTS = METRICS.counter('upstream_requests_total',
+                                    'Calls to HydroShare, GEOGloWS and IDEAM FEWS by result',
+                                    labels=('service', 'operation', 'status'))
+UPSTREAM_SECONDS = METRICS.histogram('upstream_request_seconds',
+                                     'Duration of the upstream calls',
+                                     labels=('service', 'operation'))
+REQUEST_SECONDS = METRICS.histogram('request_seconds',
+                                    'Duration of the timed controllers',
+                                    labels=('endpoint', ))
+CACHE_REQUESTS = METRICS.counter('cache_requests_total',
+                                 'Lookups of the in-process caches by result (hit, miss)',
+                                 labels=('cache', 'result'))
+CSV_EXPORTS = METRICS.counter('csv_exports_total',
+                              'CSV downloads by export',
+                              labels=('export', ))
+CSV_EXPORT_BYTES = METRICS.histogram('csv_export_bytes',
+                                     'Size of the CSV downloads',
+                                     labels=('export', ), buckets=BYTES_BUCKETS)
+WORKSPACE_FILE_BYTES = METRICS.gauge('workspace_file_bytes',
+                                     'Size of the JSON files of the app workspace',
+                                     labels=('file', ))
+
+
+class Upstream_call:
+    '''
+    Result of an upstream call; status may be set inside the block
+    (e.g. 'http_404')
+    '''
+    def __init__(self):
+        self.status = 'ok'
+
+
+@contextmanager
+def upstream(service, operation):
+    '''
+    Count and time an upstream call (with upstream('geoglows', 'ForecastStats'): ...).
+    Exceptions are counted with status 'error' and raised.
+    '''
+    call = Upstream_call()
+    start = time.perf_counter()
+    try:
+        yield call
+    except Exception:
+        call.status = 'error'
+        raise
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, service=service, operation=operation)
+        UPSTREAM_REQUESTS.inc(service=service, operation=operation, status=call.status)
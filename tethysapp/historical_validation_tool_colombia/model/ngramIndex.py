@@ -0,0 +1,73 @@
+import unicodedata
+from collections import Counter
+
+
+######################################################################
+class Ngram_index:
+    def __init__(self, keys, n=3):
+        '''
+        Inverted n-gram (trigram by default) index for fuzzy, accent
+        insensitive search of names
+        Input:
+            keys : list = names to index
+            n    : int  = length of the n-grams
+        '''
+        self.n = n
+        self.keys = sorted(set(keys))
+        self.grams = [self.__grams__(key) for key in self.keys]
+
+        self.index = {}
+        for num_key, grams in enumerate(self.grams):
+            for gram in grams:
+                self.index.setdefault(gram, []).append(num_key)
+
+
+    def __call__(self, query, top_k=10, min_score=0.2):
+        '''
+        Input:
+            query     : str   = text to search
+            top_k     : int   = max number of results
+            min_score : float = min similarity (jaccard over n-grams)
+        Output:
+            rv        : list  = [(key, score), ...] best matches first
+        '''
+        grams = self.__grams__(query)
+        if len(grams) == 0:
+            return []
+
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.index.get(gram, []))
+
+        rv = []
+        for num_key, count in shared.items():
+            score = count / (len(grams) + len(self.grams[num_key]) - count)
+            if score >= min_score:
+                rv.append((self.keys[num_key], round(score, 3)))
+
+        rv.sort(key=lambda x: (-x[1], x[0]))
+        return rv[:top_k]
+
+
+    def __grams__(self, text):
+        text = fold_accents(text)
+        if text == '':
+            return set()
+
+        text = ' {} '.format(text)
+        return {text[ii:ii + self.n] for ii in range(len(text) - self.n + 1)}
+######################################################################
+
+
+def fold_accents(text):
+    '''
+    Upper case text without accents and repeated blanks. Ñ is kept, as in
+    the indexed station names (normalize_name)
+    '''
+    text = unicodedata.normalize('NFC', str(text).replace('_', ' ')).upper()
+    text = ''.join(char if char == 'Ñ' else _strip_marks(char) for char in text)
+    return ' '.join(text.split())
+
+
+def _strip_marks(char):
+    return ''.join(part for part in unicodedata.normalize('NFKD', char) if not unicodedata.combining(part))
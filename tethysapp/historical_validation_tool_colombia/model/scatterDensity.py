@@ -0,0 +1,134 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .fileCache import FILE_CACHE
+
+
+# Bins by axis of the density (binned) scatter
+SCATTER_BINS = 60
+
+# Pairs (original + corrected) above which the scatter is binned by default
+SCATTER_MARKERS_LIMIT = 20000
+
+# Workspace files of the selected station (get_popup_response)
+SCATTER_FILES = ['observed_data.json', 'simulated_data.json', 'corrected_data.json']
+
+
+######################################################################
+class Scatter_data:
+    def __init__(self, observed_df, simulated_df, corrected_df):
+        '''
+        Simulated - observed pairs of the original and the bias corrected
+        simulation, with their regression fit (computed once by station)
+        Input:
+            observed_df  : DataFrame = observed daily discharge
+            simulated_df : DataFrame = original simulation
+            corrected_df : DataFrame = bias corrected simulation
+        '''
+        import hydrostats.data as hd
+        import scipy.stats as sp
+
+        self.series = {}
+        for name, sim_df in [('original', simulated_df), ('corrected', corrected_df)]:
+            merged_df = hd.merge_data(sim_df=sim_df, obs_df=observed_df)
+            sim = merged_df.iloc[:, 0].to_numpy(dtype=float)
+            obs = merged_df.iloc[:, 1].to_numpy(dtype=float)
+            sim.flags.writeable = False
+            obs.flags.writeable = False
+            self.series[name] = (sim, obs)
+
+        self.fit = {}
+        for name, (sim, obs) in self.series.items():
+            slope, intercept, r_value, p_value, std_err = sp.linregress(sim, obs)
+            self.fit[name] = {'slope'     : slope,
+                              'intercept' : intercept,
+                              'r_value'   : r_value,
+                              'min'       : min(np.min(obs), np.min(sim)),
+                              'max'       : max(np.max(obs), np.max(sim))}
+
+
+    def __len__(self):
+        return sum(len(sim) for sim, _ in self.series.values())
+
+
+    def histogram(self, name, bins=SCATTER_BINS, log=False):
+        '''
+        2-D histogram of the pairs of a series on the grid shared by both
+        series (linear or log bins)
+        Input:
+            name   : str  = 'original' or 'corrected'
+            bins   : int  = bins by axis
+            log    : bool = log spaced bins (positive pairs only)
+        Output:
+            x      : array = simulated bin center of the non empty bins
+            y      : array = observed bin center of the non empty bins
+            counts : array = pairs in the bin
+        '''
+        sim, obs = self.series[name]
+        if log:
+            keep = (sim > 0) & (obs > 0)
+            sim, obs = sim[keep], obs[keep]
+
+        edges = self.edges(bins=bins, log=log)
+        counts, _, _ = np.histogram2d(sim, obs, bins=[edges, edges])
+
+        if log:
+            centers = np.sqrt(edges[:-1] * edges[1:])
+        else:
+            centers = (edges[:-1] + edges[1:]) / 2
+
+        ii, jj = np.nonzero(counts)
+        return centers[ii], centers[jj], counts[ii, jj].astype(int)
+
+
+    def edges(self, bins=SCATTER_BINS, log=False):
+        '''
+        Bin edges of both axes and both series
+        '''
+        values = np.concatenate([np.concatenate(pair) for pair in self.series.values()])
+        if log:
+            values = values[values > 0]
+        if len(values) < 1:
+            return np.linspace(0, 1, bins + 1)
+
+        min_val, max_val = np.min(values), np.max(values)
+        if log:
+            if min_val == max_val:
+                min_val, max_val = min_val / 2, max_val * 2
+            return np.geomspace(min_val, max_val, bins + 1)
+
+        if min_val == max_val:
+            min_val, max_val = min_val - 0.5, max_val + 0.5
+        return np.linspace(min_val, max_val, bins + 1)
+######################################################################
+
+
+def _readworkspace(workspace_dir):
+    '''
+    Observed, simulated and corrected series saved by get_popup_response
+    '''
+    observed_df = pd.read_json(os.path.join(workspace_dir, SCATTER_FILES[0]), convert_dates=True)
+    observed_df.index = pd.to_datetime(observed_df.index, unit='ms')
+    observed_df.sort_index(inplace=True, ascending=True)
+
+    rv = [observed_df]
+    for file_name in SCATTER_FILES[1:]:
+        df = pd.read_json(os.path.join(workspace_dir, file_name), convert_dates=True)
+        df.index = pd.to_datetime(df.index)
+        df.sort_index(inplace=True, ascending=True)
+        rv.append(df)
+
+    return rv
+
+
+def get_scatter_data(workspace_dir):
+    '''
+    Scatter pairs and fits of the selected station shared by the scatter
+    views. They are rebuilt only when the workspace files change.
+    '''
+    paths = [os.path.join(workspace_dir, file_name) for file_name in SCATTER_FILES]
+    return FILE_CACHE(key=('scatter data', workspace_dir),
+                      paths=paths,
+                      builder=lambda: Scatter_data(*_readworkspace(workspace_dir)))
@@ -0,0 +1,172 @@
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .batchValidation import read_results_table, VALIDATION_KINDS
+from .fileCache import FILE_CACHE
+from .spatialIndex import Spatial_index
+
+
+# Metrics of the layer when none are requested
+SKILL_METRICS = ['kge_2012', 'nse', 'me']
+
+
+######################################################################
+class Skill_layer:
+    def __init__(self, table, payloads_size=256):
+        '''
+        Station skill (precomputed metrics of the regional validation) with
+        sorted (thresholds) and spatial (bbox) indexes
+        Input:
+            table         : DataFrame = results table (run_regional_validation)
+            payloads_size : int       = max number of memoized payloads
+        '''
+        if 'error' in table.columns:
+            table = table[table['error'].fillna('') == '']
+
+        self.station_id = table['station_id'].to_numpy(dtype='int64')
+        self.latitude = table['latitude'].to_numpy(dtype=float)
+        self.longitude = table['longitude'].to_numpy(dtype=float)
+
+        self.columns = [column for column in table.columns
+                        if column.rsplit('_', 1)[-1] in VALIDATION_KINDS]
+        self.values = {column : table[column].to_numpy(dtype=float) for column in self.columns}
+
+        # Sorted values by metric (NaN at the end) -> thresholds by searchsorted
+        self.order = {column : np.argsort(values, kind='stable') for column, values in self.values.items()}
+        self.sorted = {column : self.values[column][order] for column, order in self.order.items()}
+
+        self.spatial_index = Spatial_index(self.latitude, self.longitude)
+
+        self.payloads_size = payloads_size
+        self.__payloads = OrderedDict()
+        self.__lock = threading.Lock()
+
+
+    def __call__(self, metrics=None, thresholds=None, bbox=None, fmt='array'):
+        '''
+        Input:
+            metrics    : list  = metrics ('kge_2012') or columns ('kge_2012_bc')
+                                 of the payload (None -> SKILL_METRICS)
+            thresholds : dict  = {column : (min, max)} None -> no limit
+            bbox       : list  = [min_lat, min_lon, max_lat, max_lon]
+            fmt        : str   = 'array' or 'geojson'
+        Output:
+            rv         : str   = JSON payload (memoized by query)
+        '''
+        columns = self.metric_columns(metrics)
+        thresholds = tuple(sorted((thresholds or {}).items()))
+        bbox = None if bbox is None else tuple(float(ii) for ii in bbox)
+
+        key = (tuple(columns), thresholds, bbox, fmt)
+        with self.__lock:
+            if key in self.__payloads:
+                self.__payloads.move_to_end(key)
+                return self.__payloads[key]
+
+        rows = self.query(thresholds=dict(thresholds), bbox=bbox)
+        if fmt == 'geojson':
+            rv = self.__geojsonpayload__(rows, columns)
+        else:
+            rv = self.__arraypayload__(rows, columns)
+        rv = json.dumps(rv, separators=(',', ':'))
+
+        with self.__lock:
+            self.__payloads[key] = rv
+            while len(self.__payloads) > self.payloads_size:
+                self.__payloads.popitem(last=False)
+
+        return rv
+
+
+    def metric_columns(self, metrics=None):
+        '''
+        Columns of the requested metrics (both kinds for a metric name)
+        '''
+        rv = []
+        for metric in (SKILL_METRICS if metrics is None else metrics):
+            if metric in self.values:
+                rv.append(metric)
+                continue
+            kinds = ['{0}_{1}'.format(metric, kind) for kind in VALIDATION_KINDS]
+            if not any(column in self.values for column in kinds):
+                raise ValueError('Unknown metric {0}'.format(metric))
+            rv += [column for column in kinds if column in self.values]
+        return rv
+
+
+    def query(self, thresholds=None, bbox=None):
+        '''
+        Input:
+            thresholds : dict = {column : (min, max)} None -> no limit
+            bbox       : list = [min_lat, min_lon, max_lat, max_lon]
+        Output:
+            rows       : array = positions of the stations, ascending
+        '''
+        mask = np.ones(len(self.station_id), dtype=bool)
+
+        for column, (min_val, max_val) in (thresholds or {}).items():
+            if column not in self.values:
+                raise ValueError('Unknown metric {0}'.format(column))
+            values = self.sorted[column]
+            first = 0 if min_val is None else np.searchsorted(values, min_val, side='left')
+            last = np.searchsorted(values, np.inf, side='right') if max_val is None \
+                else np.searchsorted(values, max_val, side='right')
+
+            inside = np.zeros(len(mask), dtype=bool)
+            inside[self.order[column][first:last]] = True
+            mask &= inside
+
+        if bbox is not None:
+            inside = np.zeros(len(mask), dtype=bool)
+            inside[self.spatial_index.bbox(*bbox)] = True
+            mask &= inside
+
+        return np.flatnonzero(mask)
+
+
+    def __arraypayload__(self, rows, columns):
+        data = [self.station_id[rows].tolist(),
+                np.round(self.latitude[rows], 5).tolist(),
+                np.round(self.longitude[rows], 5).tolist()]
+        data += [_floats(self.values[column][rows]) for column in columns]
+
+        return {'columns' : ['station_id', 'latitude', 'longitude'] + columns,
+                'count'   : len(rows),
+                'rows'    : [list(row) for row in zip(*data)]}
+
+
+    def __geojsonpayload__(self, rows, columns):
+        values = {column : _floats(self.values[column][rows]) for column in columns}
+
+        features = []
+        for num, row in enumerate(rows):
+            properties = {'station_id' : int(self.station_id[row])}
+            properties.update({column : values[column][num] for column in columns})
+            features.append({'type'       : 'Feature',
+                             'geometry'   : {'type'        : 'Point',
+                                             'coordinates' : [round(float(self.longitude[row]), 5),
+                                                              round(float(self.latitude[row]), 5)]},
+                             'properties' : properties})
+
+        return {'type' : 'FeatureCollection', 'features' : features}
+######################################################################
+
+
+def _floats(values):
+    '''
+    JSON ready floats (NaN -> None)
+    '''
+    return [None if np.isnan(value) else round(float(value), 4) for value in values]
+
+
+def get_skill_layer(path_dir):
+    '''
+    Skill layer of a results table shared by the process. It is rebuilt only
+    when the table changes.
+    '''
+    return FILE_CACHE(key=('skill layer', path_dir),
+                      paths=[path_dir],
+                      builder=lambda: Skill_layer(read_results_table(path_dir)))
@@ -0,0 +1,52 @@
+import numpy as np
+
+
+######################################################################
+class Spatial_index:
+    def __init__(self, lat, lon):
+        '''
+        KD-tree (nearest) and latitude sorted (bounding box) index of points
+        Input:
+            lat : array = latitude of the points
+            lon : array = longitude of the points
+        '''
+        from scipy.spatial import cKDTree
+
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+
+        # Longitude scaled to the mean latitude -> near isotropic distances
+        self.lon_scale = np.cos(np.deg2rad(np.nanmean(self.lat)))
+        self.tree = cKDTree(np.column_stack([self.lat, self.lon * self.lon_scale]))
+
+        self.lat_order = np.argsort(self.lat, kind='stable')
+        self.lat_sorted = self.lat[self.lat_order]
+
+
+    def nearest(self, lat, lon, k=1):
+        '''
+        Input:
+            lat, lon : float = point to search
+            k        : int   = number of points
+        Output:
+            rows     : list  = position of the k nearest points
+        '''
+        k = max(1, min(int(k), len(self.lat)))
+        _, rows = self.tree.query([lat, lon * self.lon_scale], k=k)
+        return np.atleast_1d(rows).tolist()
+
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon):
+        '''
+        Input:
+            min_lat, min_lon, max_lat, max_lon : float = bounding box
+        Output:
+            rows : list = position of the points inside the bounding box
+        '''
+        first = np.searchsorted(self.lat_sorted, min_lat, side='left')
+        last = np.searchsorted(self.lat_sorted, max_lat, side='right')
+
+        rows = self.lat_order[first:last]
+        rows = rows[(self.lon[rows] >= min_lon) & (self.lon[rows] <= max_lon)]
+        return np.sort(rows).tolist()
+######################################################################
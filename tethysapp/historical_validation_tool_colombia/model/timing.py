@@ -0,0 +1,191 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+from .metrics import REQUEST_SECONDS
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Timer of the request served by the current thread
+_local = threading.local()
+
+
+######################################################################
+class Request_timer:
+    def __init__(self, endpoint):
+        '''
+        Named spans (ms) of one request. Spans with the same name are added.
+        Input:
+            endpoint : str = name of the controller
+        '''
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.spans = OrderedDict()
+
+        self.__stage = None
+
+
+    def add(self, name, duration):
+        '''
+        Input:
+            name     : str   = span name
+            duration : float = seconds
+        '''
+        self.spans[name] = self.spans.get(name, 0) + duration * 1000
+
+
+    def stage(self, name):
+        '''
+        Close the running stage and open the stage name (None -> only close)
+        '''
+        now = time.perf_counter()
+        if self.__stage is not None:
+            self.add(self.__stage[0], now - self.__stage[1])
+        self.__stage = None if name is None else (name, now)
+
+
+    def total(self):
+        return (time.perf_counter() - self.start) * 1000
+
+
+    def server_timing(self):
+        '''
+        Server-Timing header value (spans and total, ms)
+        '''
+        items = ['{0};dur={1:.1f}'.format(name, dur) for name, dur in self.spans.items()]
+        items.append('total;dur={0:.1f}'.format(self.total()))
+        return ', '.join(items)
+
+
+    def as_dict(self):
+        return {'endpoint' : self.endpoint,
+                'total_ms' : round(self.total(), 1),
+                'spans'    : {name : round(dur, 1) for name, dur in self.spans.items()}}
+######################################################################
+
+
+######################################################################
+class Timing_stats:
+    def __init__(self, window=500):
+        '''
+        In memory p50/p95 of the last requests of every endpoint
+        Input:
+            window : int = requests kept by endpoint
+        '''
+        self.window = window
+
+        self.__count = {}
+        self.__samples = {}
+        self.__lock = threading.Lock()
+
+
+    def record(self, timer):
+        '''
+        Input:
+            timer : Request_timer = finished request
+        '''
+        samples = [('total', timer.total())] + list(timer.spans.items())
+
+        with self.__lock:
+            self.__count[timer.endpoint] = self.__count.get(timer.endpoint, 0) + 1
+            endpoint = self.__samples.setdefault(timer.endpoint, OrderedDict())
+            for name, duration in samples:
+                endpoint.setdefault(name, deque(maxlen=self.window)).append(duration)
+
+
+    def summary(self, endpoint=None):
+        '''
+        Input:
+            endpoint : str  = endpoint to summarize (None -> all)
+        Output:
+            rv       : dict = {endpoint : {'count' : int,
+                                           'spans' : {name : {'p50' : ms, 'p95' : ms}}}}
+        '''
+        with self.__lock:
+            endpoints = {key : (self.__count[key], {name : list(values) for name, values in spans.items()})
+                         for key, spans in self.__samples.items()
+                         if endpoint is None or key == endpoint}
+
+        rv = {}
+        for key, (count, spans) in endpoints.items():
+            rv[key] = {'count' : count, 'spans' : {}}
+            for name, values in spans.items():
+                p50, p95 = np.percentile(values, [50, 95])
+                rv[key]['spans'][name] = {'p50' : round(float(p50), 1), 'p95' : round(float(p95), 1)}
+        return rv
+
+
+    def clear(self):
+        with self.__lock:
+            self.__count.clear()
+            self.__samples.clear()
+######################################################################
+
+# Shared by the whole process
+TIMING_STATS = Timing_stats()
+
+
+def current_timer():
+    '''
+    Request_timer of the current thread, None outside a timed controller
+    '''
+    return getattr(_local, 'timer', None)
+
+
+@contextmanager
+def span(name):
+    '''
+    Time a block (with span(name): ...) or a function (@span(name)) into
+    the current request, if any
+    '''
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer = current_timer()
+        if timer is not None:
+            timer.add(name, time.perf_counter() - start)
+
+
+def stage(name):
+    '''
+    Sequential spans: close the running stage of the current request and
+    open the stage name
+    '''
+    timer = current_timer()
+    if timer is not None:
+        timer.stage(name)
+
+
+def timed(view):
+    '''
+    Controller decorator: times the request, logs its spans (JSON), adds the
+    Server-Timing header and records the endpoint stats (TIMING_STATS and
+    REQUEST_SECONDS)
+    '''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        timer = Request_timer(view.__name__)
+        previous = current_timer()
+        _local.timer = timer
+
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            timer.stage(None)
+            _local.timer = previous
+            TIMING_STATS.record(timer)
+            REQUEST_SECONDS.observe(timer.total() / 1000, endpoint=timer.endpoint)
+            LOGGER.info(json.dumps(dict(event='timing', **timer.as_dict())))
+
+        response['Server-Timing'] = timer.server_timing()
+        return response
+
+    return wrapper
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import pickle
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .metrics import upstream
+
+
+UPSTREAM_MODES = ['live', 'record', 'replay']
+
+# Max threads of the concurrent calls of one request (Upstream_batch)
+UPSTREAM_BATCH_WORKERS = 8
+
+
+######################################################################
+class Upstream_transport:
+    def __init__(self, mode='live', fixtures_dir=None, latency=None, latency_scale=1.0, jitter=0.0):
+        '''
+        Access to HydroShare, GEOGloWS and IDEAM FEWS with three modes:
+            live   : call the services
+            record : call the services and save the responses in fixtures_dir
+            replay : serve the saved responses (no network) after an
+                     injected latency
+        Every call is counted and timed (metrics.upstream).
+        Input:
+            mode          : str   = 'live', 'record' or 'replay'
+            fixtures_dir  : str   = folder of the recorded responses
+            latency       : float = replay latency in seconds (None -> the
+                                    recorded one)
+            latency_scale : float = factor of the replay latency
+            jitter        : float = +/- fraction of random latency
+        '''
+        self.configure(mode=mode, fixtures_dir=fixtures_dir, latency=latency,
+                       latency_scale=latency_scale, jitter=jitter)
+
+
+    def configure(self, mode='live', fixtures_dir=None, latency=None, latency_scale=1.0, jitter=0.0):
+        if mode not in UPSTREAM_MODES:
+            raise ValueError('Upstream mode must be one of {0}'.format(UPSTREAM_MODES))
+        if mode != 'live' and fixtures_dir is None:
+            raise ValueError('Upstream mode {0} needs a fixtures folder'.format(mode))
+
+        self.mode = mode
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+
+
+    @classmethod
+    def from_env(cls):
+        '''
+        Transport configured by HVT_UPSTREAM_MODE, HVT_UPSTREAM_FIXTURES,
+        HVT_UPSTREAM_LATENCY, HVT_UPSTREAM_LATENCY_SCALE and
+        HVT_UPSTREAM_JITTER (live by default)
+        '''
+        latency = os.environ.get('HVT_UPSTREAM_LATENCY', '')
+        return cls(mode=os.environ.get('HVT_UPSTREAM_MODE', 'live'),
+                   fixtures_dir=os.environ.get('HVT_UPSTREAM_FIXTURES'),
+                   latency=float(latency) if latency != '' else None,
+                   latency_scale=float(os.environ.get('HVT_UPSTREAM_LATENCY_SCALE', 1)),
+                   jitter=float(os.environ.get('HVT_UPSTREAM_JITTER', 0)))
+
+
+    def get(self, service, operation, url, params=None, **kwargs):
+        '''
+        requests.get through the transport
+        Input:
+            service   : str  = upstream service (metrics label and folder)
+            operation : str  = API operation (metrics label)
+            url       : str  = requested url
+            params    : dict = query parameters
+            kwargs    : dict = other arguments of requests.get
+        Output:
+            rv        : requests.Response
+        '''
+        key = _fixturekey('GET', url, params)
+        path = self.__fixturepath__(service, operation, key, '.json')
+
+        with upstream(service, operation) as call:
+            if self.mode == 'replay':
+                fixture = self.__load__(path, json_file=True)
+                self.__sleep__(fixture['elapsed'])
+                response = _response(fixture)
+            else:
+                start = time.perf_counter()
+                response = requests.get(url, params=params, **kwargs)
+                if self.mode == 'record':
+                    self.__save__(path, {'url'         : url,
+                                         'params'      : params,
+                                         'status_code' : response.status_code,
+                                         'headers'     : {'Content-Type' : response.headers.get('Content-Type', '')},
+                                         'encoding'    : response.encoding,
+                                         'content'     : response.content.decode('latin-1'),
+                                         'elapsed'     : time.perf_counter() - start})
+
+            if response.status_code != 200:
+                call.status = 'http_{0}'.format(response.status_code)
+
+        return response
+
+
+    def call(self, service, operation, function, *args, **kwargs):
+        '''
+        Client library call (geoglows.streamflow.*, HydroShare, ...) through
+        the transport. The returned object is recorded with pickle.
+        Input:
+            service   : str      = upstream service
+            operation : str      = API operation
+            function  : callable = function to call with args and kwargs
+        Output:
+            rv        : object   = returned by function
+        '''
+        key = _fixturekey(operation, repr(args), sorted(kwargs.items()))
+        path = self.__fixturepath__(service, operation, key, '.pkl')
+
+        with upstream(service, operation):
+            if self.mode == 'replay':
+                fixture = self.__load__(path, json_file=False)
+                self.__sleep__(fixture['elapsed'])
+                return fixture['value']
+
+            start = time.perf_counter()
+            rv = function(*args, **kwargs)
+            if self.mode == 'record':
+                self.__save__(path, {'value'   : rv,
+                                     'elapsed' : time.perf_counter() - start})
+        return rv
+
+
+    def batch(self, deadline=None):
+        '''
+        Concurrent calls of one request (see Upstream_batch)
+        '''
+        return Upstream_batch(self, deadline=deadline)
+
+
+    def __fixturepath__(self, service, operation, key, ext):
+        if self.fixtures_dir is None:
+            return None
+        return os.path.join(self.fixtures_dir, service, '{0}_{1}{2}'.format(operation, key, ext))
+
+
+    def __load__(self, path, json_file):
+        if not os.path.isfile(path):
+            raise FileNotFoundError('No recorded upstream response {0}'.format(path))
+
+        if json_file:
+            with open(path) as f:
+                return json.load(f)
+
+        # Fixtures are written by the record mode of this app only
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+    def __save__(self, path, fixture):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Atomic replace -> concurrent recordings never leave partial files
+        tmp_path = '{0}.{1}.tmp'.format(path, threading.get_ident())
+        if path.endswith('.json'):
+            with open(tmp_path, 'w') as f:
+                json.dump(fixture, f)
+        else:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(fixture, f)
+        os.replace(tmp_path, path)
+
+
+    def __sleep__(self, recorded):
+        latency = recorded if self.latency is None else self.latency
+        latency *= self.latency_scale
+        if self.jitter > 0:
+            latency *= 1 + random.uniform(-self.jitter, self.jitter)
+        if latency > 0:
+            time.sleep(latency)
+######################################################################
+
+
+######################################################################
+class Upstream_batch:
+    def __init__(self, transport, deadline=None):
+        '''
+        Independent upstream calls of one request, run concurrently in
+        threads owned by the request (no queue shared with other requests).
+        Every call has a socket timeout, counted from its submission, and the
+        whole batch a deadline. Unfinished calls are cancelled by close.
+        Input:
+            transport : Upstream_transport
+            deadline  : float = seconds for the whole batch (None -> no limit)
+        '''
+        self.transport = transport
+        self.deadline = None if deadline is None else time.monotonic() + deadline
+
+        self.__executor = ThreadPoolExecutor(max_workers=UPSTREAM_BATCH_WORKERS,
+                                             thread_name_prefix='upstream')
+        self.__timeouts = {}
+
+
+    def get(self, service, operation, url, timeout, params=None, **kwargs):
+        '''
+        Upstream_transport.get started now
+        Input:
+            timeout : float = seconds of the call (socket and wait)
+        Output:
+            job     : Future = of requests.Response (wait it with result)
+        '''
+        job = self.__executor.submit(self.transport.get, service, operation, url, params=params,
+                                     timeout=timeout, **kwargs)
+        self.__timeouts[job] = time.monotonic() + timeout
+        return job
+
+
+    def result(self, job):
+        '''
+        Wait a call until its timeout or the batch deadline
+        (concurrent.futures.TimeoutError after them)
+        '''
+        limit = self.__timeouts[job]
+        if self.deadline is not None:
+            limit = min(limit, self.deadline)
+        return job.result(timeout=max(limit - time.monotonic(), 0))
+
+
+    def close(self):
+        '''
+        Cancel the calls not started. Running calls end by their socket
+        timeout, without holding the request.
+        '''
+        for job in self.__timeouts:
+            job.cancel()
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+######################################################################
+
+
+def _fixturekey(*items):
+    '''
+    Stable name of a request (sha1 of its url/arguments)
+    '''
+    text = json.dumps(items, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _response(fixture):
+    '''
+    requests.Response rebuilt from a recorded fixture
+    '''
+    response = requests.Response()
+    response.status_code = fixture['status_code']
+    response.headers = CaseInsensitiveDict(fixture['headers'])
+    response.encoding = fixture['encoding']
+    response.url = fixture['url']
+    response._content = fixture['content'].encode('latin-1')
+    return response
+
+
+# Shared by the whole process
+UPSTREAM = Upstream_transport.from_env()
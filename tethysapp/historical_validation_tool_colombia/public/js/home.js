@@ -787,12 +787,39 @@ $(function() {
 
 });
 
+// Precomputed extents (bbox, centroid, area) of the boundary files
+var boundaryExtents = {};
+
+// Zoom to the boundary bbox without waiting for its geometry
+function fitBoundary(staticUrl, extentFile, geojsonFile, regionsLayer) {
+    if (!(extentFile in boundaryExtents)) {
+        boundaryExtents[extentFile] = $.getJSON(staticUrl + extentFile);
+    }
+
+    // Fallback -> extent of the loaded geometry
+    let fitLayer = function () {
+        setTimeout(function() {
+            var myExtent = regionsLayer.getSource().getExtent();
+            map.getView().fit(myExtent, map.getSize());
+        }, 500);
+    };
+
+    boundaryExtents[extentFile].done(function (extents) {
+        if (geojsonFile in extents) {
+            var myExtent = ol.proj.transformExtent(extents[geojsonFile]['bbox'], 'EPSG:4326', map.getView().getProjection());
+            map.getView().fit(myExtent, map.getSize());
+        } else {
+            fitLayer();
+        }
+    }).fail(fitLayer);
+}
+
 function getRegionGeoJsons() {
 
     let geojsons = region_index[$("#regions").val()]['geojsons'];
     for (let i in geojsons) {
         var regionsSource = new ol.source.Vector({
-           url: staticGeoJSON + geojsons[i],
+           url: 'get-boundary?layer=geojson&level=auto&name=' + geojsons[i],
            format: new ol.format.GeoJSON()
         });
 
@@ -827,10 +854,7 @@ function getRegionGeoJsons() {
                 map.removeLayer(stationsLayer);
         });
 
-        setTimeout(function() {
-            var myExtent = regionsLayer.getSource().getExtent();
-            map.getView().fit(myExtent, map.getSize());
-        }, 500);
+        fitBoundary(staticGeoJSON, 'extent.json', geojsons[i], regionsLayer);
     }
 }
 
@@ -850,7 +874,7 @@ function getBasinGeoJsons() {
     let basins = region_index2[$("#basins").val()]['geojsons'];
     for (let i in basins) {
         var regionsSource = new ol.source.Vector({
-           url: staticGeoJSON2 + basins[i],
+           url: 'get-boundary?layer=geojson2&level=auto&name=' + basins[i],
            format: new ol.format.GeoJSON()
         });
 
@@ -873,10 +897,7 @@ function getBasinGeoJsons() {
         });
         map.addLayer(regionsLayer)
 
-        setTimeout(function() {
-            var myExtent = regionsLayer.getSource().getExtent();
-            map.getView().fit(myExtent, map.getSize());
-        }, 500);
+        fitBoundary(staticGeoJSON2, 'extent2.json', basins[i], regionsLayer);
     }
 }
 
@@ -885,7 +906,7 @@ function getSubBasinGeoJsons() {
     let subbasins = region_index3[$("#subbasins").val()]['geojsons'];
     for (let i in subbasins) {
         var regionsSource = new ol.source.Vector({
-           url: staticGeoJSON3 + subbasins[i],
+           url: 'get-boundary?layer=geojson3&level=auto&name=' + subbasins[i],
            format: new ol.format.GeoJSON()
         });
 
@@ -908,10 +929,7 @@ function getSubBasinGeoJsons() {
         });
         map.addLayer(regionsLayer)
 
-        setTimeout(function() {
-            var myExtent = regionsLayer.getSource().getExtent();
-            map.getView().fit(myExtent, map.getSize());
-        }, 500);
+        fitBoundary(staticGeoJSON3, 'extent3.json', subbasins[i], regionsLayer);
     }
 }
 
@@ -0,0 +1,266 @@
+"""
+Offline benchmark of the analysis pipeline over synthetic stations. Every
+stage is timed `--repeat` times and the results are written as JSON, so
+runs of different commits can be compared.
+
+    python -m tethysapp.historical_validation_tool_colombia.scripts.benchmark --stations 10 --years 30 --output bench.json
+
+Stages whose libraries are not installed are reported as skipped. With
+`--memory` the peak memory (tracemalloc) of one more run of every stage is
+also reported.
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from .synthetic import synthetic_ensemble, synthetic_stations
+
+# make_table metrics of the default report
+BENCHMARK_METRICS = ['ME', 'RMSE', 'NRMSE (Mean)', 'MAPE', 'NSE', 'KGE (2009)', 'KGE (2012)',
+                     'R (Pearson)', 'R (Spearman)', 'r2']
+RETURN_PERIODS = [2, 5, 10, 25, 50, 100]
+
+
+######################################################################
+def stage_ingest(fixtures):
+    """
+    Workspace JSON round trip and index normalization (controllers)
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num, (observed_df, simulated_df) in enumerate(fixtures['stations']):
+            observed_file = os.path.join(tmp_dir, 'observed_{0}.json'.format(num))
+            observed_df.to_json(observed_file, orient='columns')
+            observed = pd.read_json(observed_file, convert_dates=True)
+            observed.index = pd.to_datetime(observed.index, unit='ms')
+            observed.sort_index(inplace=True, ascending=True)
+
+            simulated_file = os.path.join(tmp_dir, 'simulated_{0}.json'.format(num))
+            simulated_df.to_json(simulated_file)
+            simulated = pd.read_json(simulated_file, convert_dates=True)
+            simulated.index = pd.to_datetime(simulated.index)
+            simulated.sort_index(inplace=True, ascending=True)
+
+
+def stage_bias_correct(fixtures):
+    import geoglows
+    for observed_df, simulated_df in fixtures['stations']:
+        geoglows.bias.correct_historical(simulated_df, observed_df)
+
+
+def stage_merge(fixtures):
+    import hydrostats.data as hd
+    for observed_df, simulated_df in fixtures['stations']:
+        hd.merge_data(sim_df=simulated_df, obs_df=observed_df)
+
+
+def stage_metrics(fixtures):
+    import hydrostats as hs
+    import hydrostats.data as hd
+    for observed_df, simulated_df in fixtures['stations']:
+        merged_df = hd.merge_data(sim_df=simulated_df, obs_df=observed_df)
+        hs.make_table(merged_dataframe=merged_df, metrics=BENCHMARK_METRICS)
+
+
+def stage_return_periods(fixtures):
+    """
+    calc_return_period without its memo (repeats must fit again)
+    """
+    from ..model import Calc_return_period
+    return_period = Calc_return_period(cache_size=0)
+    for observed_df, _ in fixtures['stations']:
+        annual_max = observed_df.iloc[:, 0].groupby(observed_df.index.year).max().values
+        return_period({'t' : RETURN_PERIODS, 'data' : annual_max})
+
+
+def stage_return_periods_batch(fixtures):
+    from ..model import calc_return_period_batch
+    calc_return_period_batch(t=RETURN_PERIODS, data=fixtures['annual_max'])
+
+
+def stage_ensemble_stats(fixtures):
+    from ..model import ensemble_stats
+    for forecast_ens in fixtures['ensembles']:
+        ensemble_stats(forecast_ens)
+
+
+def stage_ensemble_correct(fixtures):
+    """
+    Ensemble path of get_time_series_bc (parse, clip to the simulated range,
+    correction factors and forecast stats) without geoglows
+    """
+    from ..model import clip_ensemble, ensemble_stats, read_forecast_ensemble
+    for content, (_, simulated_df) in zip(fixtures['ensembles_csv'], fixtures['stations']):
+        forecast_ens = read_forecast_ensemble(content)
+        monthly_simulated = simulated_df[simulated_df.index.month == forecast_ens.index[0].month].iloc[:, 0]
+        clipped, factor = clip_ensemble(forecast_ens, monthly_simulated.min(), monthly_simulated.max())
+        corrected = pd.DataFrame(clipped.to_numpy() * factor, index=clipped.index, columns=clipped.columns,
+                                 copy=False)
+        ensemble_stats(corrected)
+
+
+def stage_figure(fixtures):
+    """
+    Hydrograph of get_hydrographs (the simulation stands for the corrected
+    series, stage_bias_correct times the correction)
+    """
+    from ..model import hydrograph_figure
+    for num, (observed_df, simulated_df) in enumerate(fixtures['stations']):
+        hydrograph_figure(observed_df, simulated_df, simulated_df, num, 'Station').to_json()
+
+
+def stage_scatter_figure(fixtures):
+    """
+    Scatter data (merge and fits) and traces of get_scatterPlot
+    """
+    from ..model import Scatter_data, scatter_traces
+    for observed_df, simulated_df in fixtures['stations']:
+        scatter_traces(Scatter_data(observed_df, simulated_df, simulated_df))
+
+
+def stage_forecast_figure(fixtures):
+    """
+    Forecast stats figure of get_time_series (geoglows)
+    """
+    import geoglows
+    from ..model import ensemble_stats
+    for forecast_ens in fixtures['ensembles']:
+        geoglows.plots.forecast_stats(stats=ensemble_stats(forecast_ens)).to_json()
+######################################################################
+
+STAGES = [('ingest', stage_ingest),
+          ('bias_correct', stage_bias_correct),
+          ('merge', stage_merge),
+          ('metrics', stage_metrics),
+          ('return_periods', stage_return_periods),
+          ('return_periods_batch', stage_return_periods_batch),
+          ('ensemble_stats', stage_ensemble_stats),
+          ('ensemble_correct', stage_ensemble_correct),
+          ('figure', stage_figure),
+          ('scatter_figure', stage_scatter_figure),
+          ('forecast_figure', stage_forecast_figure)]
+
+
+def build_fixtures(stations, years, seed=0):
+    """
+    Output:
+        rv : dict = {'stations'      : [(observed_df, simulated_df), ...],
+                     'ensembles'     : [forecast_ens, ...],
+                     'ensembles_csv' : [ForecastEnsembles CSV (bytes), ...],
+                     'annual_max'    : array (stations x years)}
+    """
+    rv = {'stations'  : synthetic_stations(stations=stations, years=years, seed=seed),
+          'ensembles' : [synthetic_ensemble(seed=seed + ii) for ii in range(stations)]}
+
+    rv['ensembles_csv'] = [forecast_ens.to_csv().encode('utf-8') for forecast_ens in rv['ensembles']]
+
+    annual_max = [observed_df.iloc[:, 0].groupby(observed_df.index.year).max().values
+                  for observed_df, _ in rv['stations']]
+    length = min(len(values) for values in annual_max)
+    rv['annual_max'] = np.array([values[-length:] for values in annual_max])
+    return rv
+
+
+def run_benchmark(stations=10, years=30, repeat=3, seed=0, stages=None, memory=False):
+    """
+    Input:
+        stations : int  = number of synthetic stations
+        years    : int  = length of the daily series
+        repeat   : int  = runs of every stage
+        seed     : int  = random seed of the fixtures
+        stages   : list = names of STAGES to run (None -> all)
+        memory   : bool = also measure the peak memory of every stage
+    Output:
+        rv       : dict = {'meta' : {...}, 'stages' : {name : {...}}}
+    """
+    fixtures = build_fixtures(stations=stations, years=years, seed=seed)
+
+    rv = {'meta'   : _metadata(stations=stations, years=years, repeat=repeat, seed=seed, memory=memory),
+          'stages' : {}}
+
+    for name, function in STAGES:
+        if stages is not None and name not in stages:
+            continue
+
+        times = []
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                function(fixtures)
+                times.append(time.perf_counter() - start)
+        except ImportError as e:
+            rv['stages'][name] = {'skipped' : str(e)}
+            print('{0:<22} skipped ({1})'.format(name, e))
+            continue
+
+        rv['stages'][name] = {'min_s'    : round(min(times), 6),
+                              'median_s' : round(float(np.median(times)), 6),
+                              'mean_s'   : round(float(np.mean(times)), 6),
+                              'repeat'   : repeat}
+        print('{0:<22} {1:10.4f} s (median of {2})'.format(name, np.median(times), repeat), end='')
+
+        if memory:
+            rv['stages'][name]['peak_kib'] = round(_peakmemory(function, fixtures) / 1024, 1)
+            print(', peak {0:10.1f} KiB'.format(rv['stages'][name]['peak_kib']), end='')
+        print()
+
+    return rv
+
+
+def _peakmemory(function, fixtures):
+    '''
+    Peak of the memory allocated (tracemalloc, numpy included) by one run
+    '''
+    tracemalloc.start()
+    try:
+        function(fixtures)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _metadata(**params):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        commit = ''
+
+    return {'date'     : dt.datetime.now().isoformat(timespec='seconds'),
+            'commit'   : commit,
+            'python'   : platform.python_version(),
+            'numpy'    : np.__version__,
+            'pandas'   : pd.__version__,
+            'platform' : platform.platform(),
+            'params'   : params}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmark of the analysis pipeline')
+    parser.add_argument('--stations', type=int, default=10, help='synthetic stations')
+    parser.add_argument('--years', type=int, default=30, help='years of daily data by station')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every stage')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the fixtures')
+    parser.add_argument('--stages', nargs='*', choices=[name for name, _ in STAGES], help='stages to run')
+    parser.add_argument('--memory', action='store_true', help='also report the peak memory of every stage')
+    parser.add_argument('--output', default='benchmark.json', help='JSON results file')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(stations=args.stations, years=args.years, repeat=args.repeat,
+                            seed=args.seed, stages=args.stages, memory=args.memory)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Results written to {0}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+"""
+Build step: extent files (bbox, centroid, area) and simplified versions of
+the department, basin and subbasin boundaries (public/geojson*).
+
+    python -m tethysapp.historical_validation_tool_colombia.scripts.build_boundaries
+"""
+import os
+
+from ..model import build_boundary_extents, build_simplified_geojsons
+
+
+if __name__ == '__main__':
+    public_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'public')
+    build_boundary_extents(public_dir=public_dir)
+    build_simplified_geojsons(public_dir=public_dir)
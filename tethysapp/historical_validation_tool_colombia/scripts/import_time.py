@@ -0,0 +1,103 @@
+"""
+Import time of the app modules (python -X importtime in a new interpreter)
+checked against a budget. Worker boot pays it, so the scientific stack
+(HEAVY_MODULES) must be imported by the views that use it, not at import.
+
+    python -m tethysapp.historical_validation_tool_colombia.scripts.import_time --top 15
+
+The controllers need the Django settings of the portal (--django, with
+DJANGO_SETTINGS_MODULE in the environment). Exit status is 1 when a module
+is over its budget or loads a heavy module.
+"""
+import argparse
+import re
+import subprocess
+import sys
+
+
+APP_PACKAGE = 'tethysapp.historical_validation_tool_colombia'
+
+# Seconds of a cold import (cumulative -X importtime of the module): the
+# measured import plus a margin, below the ~1.2 s of scipy.stats alone, so
+# a view library imported at module level again goes over the budget
+# (model ~0.45 s, mostly pandas; controllers add django and tethys_sdk)
+IMPORT_BUDGETS = {APP_PACKAGE + '.model'       : 0.8,
+                  APP_PACKAGE + '.controllers' : 1.5}
+
+# Libraries loaded on first use only
+HEAVY_MODULES = ['geoglows', 'hydrostats', 'HydroErr', 'plotly', 'scipy', 'sklearn', 'hs_restclient']
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def import_time(module, django=False):
+    """
+    Input:
+        module : str  = module to import
+        django : bool = run django.setup() before (not counted)
+    Output:
+        rv     : dict = 'seconds' : cumulative import time of module
+                        'modules' : {name : cumulative seconds} of every import
+                        'heavy'   : HEAVY_MODULES loaded by the import
+                        'loaded'  : every module loaded by the import
+    """
+    code = 'import django; django.setup(); ' if django else ''
+    code += 'import sys; before = set(sys.modules); '
+    code += 'import {0}; '.format(module)
+    code += 'print(\"\\n\".join(sorted(set(sys.modules) - before)))'
+
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                         capture_output=True, text=True)
+    if res.returncode != 0:
+        raise RuntimeError('Import of {0} failed:\n{1}'.format(module, res.stderr[-2000:]))
+
+    modules = {}
+    for line in res.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is not None:
+            modules[match.group(4)] = int(match.group(2)) / 1e6
+
+    # Parent packages are imported first -> the module import is their sum
+    parts = module.split('.')
+    seconds = sum(modules.get('.'.join(parts[:ii]), 0) for ii in range(1, len(parts) + 1))
+
+    loaded = res.stdout.split()
+    heavy = [name for name in HEAVY_MODULES if name in loaded]
+
+    return {'seconds' : seconds,
+            'modules' : modules,
+            'heavy'   : heavy,
+            'loaded'  : loaded}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import time budget of the app modules')
+    parser.add_argument('--modules', nargs='*', default=list(IMPORT_BUDGETS), help='modules to import')
+    parser.add_argument('--budget', type=float, help='seconds by module (default: IMPORT_BUDGETS)')
+    parser.add_argument('--django', action='store_true', help='run django.setup() before the import')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to show')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        if module.endswith('.controllers') and not args.django:
+            print('{0:<68} skipped (needs --django)'.format(module))
+            continue
+
+        rv = import_time(module, django=args.django)
+        budget = args.budget if args.budget is not None else IMPORT_BUDGETS.get(module, 1.0)
+        ok = rv['seconds'] <= budget and len(rv['heavy']) == 0
+        failed = failed or not ok
+
+        print('{0:<68} {1:7.3f} s (budget {2:.1f} s) {3}'.format(module, rv['seconds'], budget,
+                                                                 'ok' if ok else 'FAIL'))
+        if len(rv['heavy']) > 0:
+            print('    heavy modules loaded: {0}'.format(', '.join(rv['heavy'])))
+        for name, seconds in sorted(rv['modules'].items(), key=lambda item: -item[1])[:args.top]:
+            print('    {0:<64} {1:7.3f} s'.format(name, seconds))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
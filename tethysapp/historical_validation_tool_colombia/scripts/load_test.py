@@ -0,0 +1,322 @@
+"""
+Load test: N simulated users clicking random stations of IDEAM_Stations_v2.json
+with the request sequence of public/js/home.js:
+
+    get-request-data -> get-hydrographs -> (dailyAverages, monthlyAverages,
+    scatterPlot, scatterPlotLogScale, volumeAnalysis, volume-table-ajax,
+    make-table-ajax, get-time-series -> get-time-series-bc)
+
+Reports latency percentiles, errors and data mix-ups (deterministic responses
+that differ from a one-user baseline) by endpoint.
+
+Against a running server (start it with HVT_UPSTREAM_MODE=replay and
+HVT_UPSTREAM_FIXTURES=<folder> to use recorded upstream data):
+
+    python -m tethysapp.historical_validation_tool_colombia.scripts.load_test \\
+        --base-url http://localhost:8000/apps/historical-validation-tool-colombia/ --users 8 --clicks 5
+
+In process with the Django test client (DJANGO_SETTINGS_MODULE of the portal):
+
+    python -m tethysapp.historical_validation_tool_colombia.scripts.load_test \\
+        --django --fixtures <folder> --upstream replay --users 8 --clicks 5
+
+Use --upstream record (one user) first to record the fixtures of the stations.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+STATIONS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                             'workspaces', 'app_workspace', 'IDEAM_Stations_v2.json')
+
+# Charts and tables requested by home.js after get-hydrographs
+FANOUT_ENDPOINTS = ['get-dailyAverages', 'get-monthlyAverages', 'get-scatterPlot',
+                    'get-scatterPlotLogScale', 'get-volumeAnalysis', 'volume-table-ajax/',
+                    'make-table-ajax']
+
+# Endpoints with deterministic responses (Plotly views have random ids)
+FINGERPRINT_ENDPOINTS = ['volume-table-ajax/', 'make-table-ajax']
+
+# makeDefaultTable of home.js
+DEFAULT_TABLE = {'metrics[]' : ['ME', 'RMSE', 'NRMSE (Mean)', 'MAPE', 'NSE', 'KGE (2009)', 'KGE (2012)',
+                                'R (Pearson)', 'R (Spearman)', 'r2'],
+                 'mase_m' : 1, 'dmod_j' : 1, 'nse_mod_j' : 1, 'h6_k_MHE' : 1, 'h6_k_AHE' : 1,
+                 'h6_k_RMSHE' : 1, 'lm_x_bar' : 1, 'd1_p_x_bar' : 1}
+
+
+######################################################################
+class Http_client:
+    def __init__(self, base_url, cookies=None, timeout=300):
+        '''
+        Requests to a running server
+        Input:
+            base_url : str  = url of the app (ends with /)
+            cookies  : dict = session cookies (logged user)
+            timeout  : float = seconds by request
+        '''
+        import requests
+
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.session = requests.Session()
+        self.session.cookies.update(cookies or {})
+        self.timeout = timeout
+
+
+    def get(self, path, params):
+        '''
+        Output:
+            status : int   = HTTP status
+            body   : bytes = response content
+        '''
+        res = self.session.get(self.base_url + path, params=params, timeout=self.timeout)
+        return res.status_code, res.content
+######################################################################
+
+
+######################################################################
+class Django_client:
+    def __init__(self, prefix, username=None):
+        '''
+        Requests through the Django test client (same process)
+        Input:
+            prefix   : str = url of the app (ends with /)
+            username : str = existing user to log in
+        '''
+        from django.test import Client
+
+        self.prefix = prefix if prefix.endswith('/') else prefix + '/'
+        self.client = Client()
+        if username is not None:
+            from django.contrib.auth import get_user_model
+            self.client.force_login(get_user_model().objects.get(username=username))
+
+
+    def get(self, path, params):
+        res = self.client.get(self.prefix + path, data=params)
+        return res.status_code, res.content
+######################################################################
+
+
+######################################################################
+class Load_report:
+    def __init__(self, baseline=None):
+        '''
+        Latencies, errors and mix-ups by endpoint (thread safe)
+        Input:
+            baseline : dict = {(station, endpoint) : fingerprint}
+        '''
+        self.baseline = baseline
+        self.fingerprints = {}
+
+        self.__latency = {}
+        self.__errors = {}
+        self.__mixups = {}
+        self.__lock = threading.Lock()
+
+
+    def add(self, endpoint, station, seconds, status, body):
+        error = status != 200 or _iserror(body)
+
+        fingerprint = None
+        if not error and endpoint in FINGERPRINT_ENDPOINTS:
+            fingerprint = hashlib.sha1(body).hexdigest()
+
+        with self.__lock:
+            self.__latency.setdefault(endpoint, []).append(seconds)
+            self.__errors[endpoint] = self.__errors.get(endpoint, 0) + error
+
+            if fingerprint is not None:
+                self.fingerprints.setdefault((station, endpoint), fingerprint)
+                expected = None if self.baseline is None else self.baseline.get((station, endpoint))
+                mixup = expected is not None and expected != fingerprint
+                self.__mixups[endpoint] = self.__mixups.get(endpoint, 0) + mixup
+
+        return not error
+
+
+    def summary(self):
+        '''
+        Output:
+            rv : dict = {endpoint : {'count', 'p50_s', 'p95_s', 'p99_s', 'max_s',
+                                     'error_rate', 'mixup_rate'}}
+        '''
+        rv = {}
+        with self.__lock:
+            for endpoint, latency in self.__latency.items():
+                p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+                checked = len(latency) - self.__errors[endpoint]
+                rv[endpoint] = {'count'      : len(latency),
+                                'p50_s'      : round(float(p50), 4),
+                                'p95_s'      : round(float(p95), 4),
+                                'p99_s'      : round(float(p99), 4),
+                                'max_s'      : round(float(max(latency)), 4),
+                                'error_rate' : round(self.__errors[endpoint] / len(latency), 4),
+                                'mixup_rate' : (round(self.__mixups[endpoint] / checked, 4)
+                                                if endpoint in self.__mixups and checked > 0 else None)}
+        return rv
+######################################################################
+
+
+def _iserror(body):
+    '''
+    Controllers answer errors with 200 and {"error": ...}
+    '''
+    if not body.startswith(b'{'):
+        return False
+    try:
+        return 'error' in json.loads(body.decode('utf-8'))
+    except ValueError:
+        return False
+
+
+def load_stations(path_dir=STATIONS_FILE):
+    '''
+    Output:
+        rv : list = request parameters of the stations (as home.js)
+    '''
+    with open(path_dir) as f:
+        features = json.load(f)['features']
+
+    return [{'watershed'   : 'south_america',
+             'subbasin'    : 'geoglows',
+             'streamcomid' : str(feature['properties']['new_COMID']),
+             'stationcode' : str(feature['properties']['ID']),
+             'stationname' : feature['properties']['Name']}
+            for feature in features]
+
+
+def station_click(client, station, report, fanout=6):
+    '''
+    Request sequence of a click on a station (home.js). The fan-out uses up
+    to fanout parallel requests, as a browser by host.
+    '''
+    def request(endpoint, params):
+        start = time.perf_counter()
+        status, body = client.get(endpoint, params)
+        return report.add(endpoint, station['stationcode'], time.perf_counter() - start, status, body)
+
+    if not request('get-request-data', station):
+        return
+    if not request('get-hydrographs', station):
+        return
+
+    forecast = dict(station, startdate='')
+
+    def forecasts():
+        if request('get-time-series/', forecast):
+            request('get-time-series-bc/', forecast)
+
+    with ThreadPoolExecutor(max_workers=fanout) as pool:
+        jobs = [pool.submit(forecasts)]
+        for endpoint in FANOUT_ENDPOINTS:
+            params = dict(station, **DEFAULT_TABLE) if endpoint == 'make-table-ajax' else station
+            jobs.append(pool.submit(request, endpoint, params))
+        for job in jobs:
+            job.result()
+
+
+def run_load(make_client, stations, users=4, clicks=5, fanout=6, seed=0, baseline=None):
+    '''
+    Input:
+        make_client : callable = new client (one by user)
+        stations    : list     = parameters of the stations to click
+        users       : int      = concurrent users
+        clicks      : int      = clicks by user
+        fanout      : int      = parallel requests by user
+        seed        : int      = random seed of the clicks
+        baseline    : dict     = fingerprints of a one-user run
+    Output:
+        report      : Load_report
+        seconds     : float    = duration of the test
+    '''
+    report = Load_report(baseline=baseline)
+
+    def user(num_user):
+        rng = random.Random(seed + num_user)
+        client = make_client()
+        for _ in range(clicks):
+            station_click(client, rng.choice(stations), report, fanout=fanout)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        for job in [pool.submit(user, num_user) for num_user in range(users)]:
+            job.result()
+
+    return report, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test of the station click sequence')
+    parser.add_argument('--base-url', help='url of the app in a running server')
+    parser.add_argument('--cookie', action='append', default=[], help='name=value session cookie (HTTP)')
+    parser.add_argument('--django', action='store_true', help='use the Django test client (in process)')
+    parser.add_argument('--prefix', default='/apps/historical-validation-tool-colombia/', help='app url (Django)')
+    parser.add_argument('--username', help='user to log in (Django)')
+    parser.add_argument('--upstream', choices=['live', 'record', 'replay'], help='upstream mode (Django)')
+    parser.add_argument('--fixtures', help='folder of the upstream fixtures (Django)')
+    parser.add_argument('--latency', type=float, help='replay latency in seconds (default: recorded)')
+    parser.add_argument('--stations', type=int, default=10, help='random stations to click')
+    parser.add_argument('--users', type=int, default=4, help='concurrent users')
+    parser.add_argument('--clicks', type=int, default=5, help='clicks by user')
+    parser.add_argument('--fanout', type=int, default=6, help='parallel requests by user')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--no-baseline', action='store_true', help='skip the one-user baseline (no mix-up check)')
+    parser.add_argument('--output', help='JSON report file')
+    args = parser.parse_args(argv)
+
+    if args.django:
+        import django
+        django.setup()
+
+        if args.upstream is not None:
+            from ..model import UPSTREAM
+            UPSTREAM.configure(mode=args.upstream, fixtures_dir=args.fixtures, latency=args.latency)
+
+        make_client = lambda: Django_client(args.prefix, username=args.username)
+    elif args.base_url is not None:
+        cookies = dict(cookie.split('=', 1) for cookie in args.cookie)
+        make_client = lambda: Http_client(args.base_url, cookies=cookies)
+    else:
+        parser.error('--base-url or --django is required')
+
+    stations = random.Random(args.seed).sample(load_stations(), args.stations)
+
+    # One user clicking every station once -> expected responses
+    baseline = None
+    if not args.no_baseline:
+        report = Load_report()
+        client = make_client()
+        for station in stations:
+            station_click(client, station, report, fanout=1)
+        baseline = report.fingerprints
+        print('Baseline: {0} stations, {1} fingerprints'.format(len(stations), len(baseline)))
+
+    report, seconds = run_load(make_client, stations, users=args.users, clicks=args.clicks,
+                               fanout=args.fanout, seed=args.seed, baseline=baseline)
+    summary = report.summary()
+
+    print('{0} users x {1} clicks in {2:.1f} s'.format(args.users, args.clicks, seconds))
+    print('{0:<26} {1:>6} {2:>8} {3:>8} {4:>8} {5:>8} {6:>7} {7:>7}'.format(
+        'endpoint', 'count', 'p50 s', 'p95 s', 'p99 s', 'max s', 'errors', 'mixups'))
+    for endpoint, row in summary.items():
+        print('{0:<26} {1:>6} {2:>8.3f} {3:>8.3f} {4:>8.3f} {5:>8.3f} {6:>7.1%} {7:>7}'.format(
+            endpoint, row['count'], row['p50_s'], row['p95_s'], row['p99_s'], row['max_s'], row['error_rate'],
+            '-' if row['mixup_rate'] is None else '{0:.1%}'.format(row['mixup_rate'])))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'params'    : vars(args),
+                       'seconds'   : round(seconds, 3),
+                       'endpoints' : summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Synthetic station fixtures (no network) shaped like the data of the app:
+observed (HydroShare), historic simulation, forecast ensembles and forecast
+stats (GEOGloWS) and real time observed data (IDEAM FEWS).
+"""
+import numpy as np
+import pandas as pd
+
+
+ENSEMBLE_MEMBERS = 52
+
+
+def synthetic_station(seed=0, years=30, end='2021-12-31', missing=0.05):
+    """
+    Daily observed and simulated series of one station
+    Input:
+        seed    : int   = random seed
+        years   : int   = length of the series
+        end     : str   = last date
+        missing : float = fraction of missing observed days
+    Output:
+        observed_df  : DataFrame = ['Observed Streamflow']
+        simulated_df : DataFrame = ['Simulated Streamflow'] (biased)
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end, periods=int(365.25 * years), freq='D')
+
+    # Bimodal (Andean) seasonality, lognormal noise and a station scale
+    doy = dates.dayofyear.values
+    scale = rng.lognormal(3, 1)
+    season = 1 + 0.6 * np.sin(2 * np.pi * doy / 365.25) + 0.3 * np.sin(4 * np.pi * doy / 365.25 + 1)
+    observed = scale * season * rng.lognormal(0, 0.35, len(dates))
+    simulated = 1.3 * scale * season ** 1.2 * rng.lognormal(0.1, 0.25, len(dates))
+
+    observed[rng.random(len(dates)) < missing] = np.nan
+
+    observed_df = pd.DataFrame({'Observed Streamflow' : observed}, index=dates)
+    observed_df.index.name = 'datetime'
+    observed_df.dropna(inplace=True)
+
+    simulated_df = pd.DataFrame({'Simulated Streamflow' : simulated}, index=dates)
+    simulated_df.index.name = 'Datetime'
+
+    return observed_df, simulated_df
+
+
+def synthetic_ensemble(seed=0, start='2022-01-01', days=15, level=50, members=ENSEMBLE_MEMBERS):
+    """
+    GEOGloWS like ensemble forecast: 3-hourly for 10 days and 6-hourly
+    after; the high resolution member (last) ends at day 10
+    Output:
+        forecast_ens : DataFrame = ['ensemble_01_m^3/s', ..., 'ensemble_52_m^3/s']
+    """
+    rng = np.random.default_rng(seed)
+
+    dates = pd.date_range(start=start, periods=10 * 8, freq='3h')
+    dates = dates.append(pd.date_range(start=dates[-1] + pd.Timedelta(hours=6), periods=(days - 10) * 4, freq='6h'))
+
+    trend = level * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+    spread = np.linspace(0.02, 0.3, len(dates))[:, None]
+    values = trend[:, None] * rng.lognormal(0, 1, (len(dates), members)) ** spread
+
+    forecast_ens = pd.DataFrame(values, index=dates,
+                                columns=['ensemble_{0:02d}_m^3/s'.format(ii + 1) for ii in range(members)])
+    forecast_ens.index.name = 'datetime'
+
+    # High resolution member only for the first 10 days
+    forecast_ens.loc[forecast_ens.index > dates[10 * 8 - 1], 'ensemble_{0:02d}_m^3/s'.format(members)] = np.nan
+    return forecast_ens
+
+
+def synthetic_forecast_stats(forecast_ens):
+    """
+    ForecastStats like table (ENSEMBLE_STATS_COLUMNS) of an ensemble, the
+    last member as high resolution
+    """
+    from ..model import ensemble_stats
+    return ensemble_stats(forecast_ens, high_res_column=forecast_ens.columns[-1])
+
+
+def synthetic_stations(stations=10, years=30, seed=0):
+    """
+    Output:
+        rv : list = [(observed_df, simulated_df), ...] one by station
+    """
+    return [synthetic_station(seed=seed + ii, years=years) for ii in range(stations)]
@@ -0,0 +1,61 @@
+"""
+Regional batch validation: metrics of the original and bias corrected
+simulation for every station of IDEAM_Stations_v2.json, in a process pool.
+Writes one results table (CSV, or Parquet with a .parquet name).
+
+    python -m tethysapp.historical_validation_tool_colombia.scripts.validate_region \\
+        --resource-id <hydroshare resource> --series-dir series --jobs 8 --output validation_results.csv
+
+Observed and simulated series are kept in --series-dir once downloaded. The
+upstream transport follows --upstream/--fixtures (or the HVT_UPSTREAM_*
+variables), so recorded fixtures can be replayed. Write the table to the app
+workspace as validation_results.csv (or .parquet) to serve it as the skill
+layer of the map (get-skill).
+"""
+import argparse
+import json
+import os
+import time
+
+from ..model import run_regional_validation, write_results_table, UPSTREAM, VALIDATION_METRICS
+
+
+STATIONS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                             'workspaces', 'app_workspace', 'IDEAM_Stations_v2.json')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Regional batch validation of the stations')
+    parser.add_argument('--resource-id', required=True, help='HydroShare resource of the discharge data')
+    parser.add_argument('--stations-file', default=STATIONS_FILE, help='stations GeoJSON')
+    parser.add_argument('--region', action='append', help='only the stations of these regions')
+    parser.add_argument('--metrics', nargs='*', default=VALIDATION_METRICS, help='hydrostats metric abbreviations')
+    parser.add_argument('--series-dir', help='folder of the downloaded observed/simulated series')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--chunk-size', type=int, default=8, help='stations by task')
+    parser.add_argument('--upstream', choices=['live', 'record', 'replay'], help='upstream mode')
+    parser.add_argument('--fixtures', help='folder of the upstream fixtures')
+    parser.add_argument('--output', default='validation_results.csv', help='results table (.csv or .parquet)')
+    args = parser.parse_args(argv)
+
+    with open(args.stations_file) as f:
+        stations = [feature['properties'] for feature in json.load(f)['features']]
+    if args.region:
+        stations = [station for station in stations if station.get('region') in args.region]
+
+    upstream_config = None
+    if args.upstream is not None:
+        upstream_config = {'mode' : args.upstream, 'fixtures_dir' : args.fixtures, 'latency' : 0}
+        UPSTREAM.configure(**upstream_config)
+
+    start = time.time()
+    table = run_regional_validation(stations, args.resource_id, metrics=args.metrics, series_dir=args.series_dir,
+                                    n_jobs=args.jobs, chunk_size=args.chunk_size, upstream_config=upstream_config)
+    write_results_table(table, args.output)
+
+    failed = (table['error'].fillna('') != '').sum()
+    print('{0} stations ({1} failed) in {2:.1f} s -> {3}'.format(len(table), failed, time.time() - start, args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -164,3 +164,126 @@ class HistoricalValidationToolColombiaTestCase(TethysTestCase):
         context = response.context
         self.assertEqual(context['my_integer'], 10)
         '''
+
+
+class ImportTimeTestCase(TethysTestCase):
+    """
+    Worker boot budget: the model and the controllers import fast and without the
+    scientific stack (geoglows, hydrostats, plotly, scipy, ...), which the views load
+    on first use. See scripts/import_time.py.
+    """
+
+    def test_model_import_time(self):
+        from tethysapp.historical_validation_tool_colombia.scripts.import_time import import_time, IMPORT_BUDGETS
+
+        module = 'tethysapp.historical_validation_tool_colombia.model'
+        rv = import_time(module)
+
+        self.assertEqual(rv['heavy'], [])
+        for name in ['scipy', 'plotly', 'geoglows']:
+            self.assertNotIn(name, rv['loaded'])
+        self.assertLess(rv['seconds'], IMPORT_BUDGETS[module])
+
+    def test_controllers_import_time(self):
+        from tethysapp.historical_validation_tool_colombia.scripts.import_time import import_time, IMPORT_BUDGETS
+
+        module = 'tethysapp.historical_validation_tool_colombia.controllers'
+        rv = import_time(module, django=True)
+
+        self.assertEqual(rv['heavy'], [])
+        for name in ['scipy', 'plotly', 'geoglows']:
+            self.assertNotIn(name, rv['loaded'])
+        self.assertLess(rv['seconds'], IMPORT_BUDGETS[module])
+
+
+class ModelEquivalenceTestCase(TethysTestCase):
+    """
+    Vectorized model functions against the straightforward versions they replaced
+    (and brute force searches), on small random inputs.
+    """
+
+    def test_confusion_matrix_bincount(self):
+        import numpy as np
+        from tethysapp.historical_validation_tool_colombia.model import (get_confusion_matrix_data, confusion_matrices,
+                                                                         RP_CLASS_LABELS)
+
+        rng = np.random.default_rng(0)
+        n_classes = len(RP_CLASS_LABELS)
+        obs = rng.integers(-1, n_classes + 1, size=(3, 400))
+        sim = rng.integers(-1, n_classes + 1, size=(3, 400))
+
+        # Pair by pair loop (sklearn confusion_matrix with labels=RP_CLASS_LABELS)
+        expected = np.zeros((3, n_classes, n_classes), dtype=int)
+        for num_station in range(3):
+            for obs_class, sim_class in zip(obs[num_station], sim[num_station]):
+                if 0 <= obs_class < n_classes and 0 <= sim_class < n_classes:
+                    expected[num_station, obs_class, sim_class] += 1
+
+        np.testing.assert_array_equal(confusion_matrices(obs, sim, n_classes=n_classes), expected)
+
+        rv, labels = get_confusion_matrix_data(obs[0], sim[0])
+        self.assertEqual(labels, RP_CLASS_LABELS)
+        np.testing.assert_array_equal(rv, expected[0])
+
+    def test_return_period_batch(self):
+        import numpy as np
+        from tethysapp.historical_validation_tool_colombia.model import calc_return_period, calc_return_period_batch
+
+        rng = np.random.default_rng(1)
+        t = [2, 5, 10, 25, 50, 100]
+        series = [rng.gumbel(loc=100, scale=30, size=size) for size in [12, 20, 35, 35, 50]]
+        series.append(np.full(10, 42.0))
+
+        # Padded with NaN to the longest series
+        data = np.full((len(series), max(len(values) for values in series)), np.nan)
+        for num_station, values in enumerate(series):
+            data[num_station, :len(values)] = values
+
+        rv = calc_return_period_batch(t=t, data=data)
+        for num_station, values in enumerate(series):
+            expected = calc_return_period(t=t, data=values)
+            np.testing.assert_allclose(rv['st'][num_station], expected, rtol=1e-6)
+
+    def test_spatial_index(self):
+        import numpy as np
+        from tethysapp.historical_validation_tool_colombia.model import Spatial_index
+
+        rng = np.random.default_rng(2)
+        lat = rng.uniform(-4, 12, size=500)
+        lon = rng.uniform(-79, -67, size=500)
+        index = Spatial_index(lat=lat, lon=lon)
+
+        for point_lat, point_lon in rng.uniform([-4, -79], [12, -67], size=(20, 2)):
+            distance = np.hypot(lat - point_lat, (lon - point_lon) * index.lon_scale)
+            self.assertEqual(index.nearest(point_lat, point_lon, k=5), np.argsort(distance)[:5].tolist())
+
+        for _ in range(20):
+            min_lat, max_lat = np.sort(rng.uniform(-4, 12, size=2))
+            min_lon, max_lon = np.sort(rng.uniform(-79, -67, size=2))
+            inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+            self.assertEqual(index.bbox(min_lat, min_lon, max_lat, max_lon), np.flatnonzero(inside).tolist())
+
+        self.assertEqual(len(index.nearest(5, -74, k=1000)), 500)
+
+    def test_ngram_index(self):
+        from tethysapp.historical_validation_tool_colombia.model import Ngram_index
+
+        index = Ngram_index(keys=['RIO MAGDALENA', 'RIO CAUCA', 'QUEBRADA LA PEÑA', 'BOGOTA', 'RIO BOGOTA'])
+
+        # Accent and case insensitive
+        self.assertEqual(index('bogotá')[0], ('BOGOTA', 1.0))
+        self.assertEqual(index('Quebrada la peña')[0], ('QUEBRADA LA PEÑA', 1.0))
+
+        # ñ is not folded (same of normalize_name), n still finds the name
+        self.assertEqual(index('quebrada la pena')[0][0], 'QUEBRADA LA PEÑA')
+        self.assertLess(index('quebrada la pena')[0][1], 1.0)
+
+        # Typos
+        self.assertEqual(index('magdalna')[0][0], 'RIO MAGDALENA')
+
+        # Best matches first, limited by top_k and min_score
+        rv = index('rio', top_k=2)
+        self.assertEqual(len(rv), 2)
+        self.assertTrue(all(key.startswith('RIO') for key, _ in rv))
+        self.assertEqual(index('xyz'), [])
+        self.assertEqual(index(''), [])